@@ -0,0 +1,130 @@
+import os
+import numpy as np
+
+import utils
+
+
+class AttentionStoreWriter:
+    """
+    Streams the attention weights of an evaluation run into a store
+    directory, one compressed chunk file per batch, indexed by example id
+    (position in the evaluated file).
+
+    Only the per-example index (labels, predictions, entities and the
+    chunk/offset of each example) is kept in memory; `close` writes it.
+    Self-attention is cropped to the sentence length and stored as float16 in
+    one flat array per chunk with per-example offsets.
+    """
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.labels = []
+        self.predictions = []
+        self.e1 = []
+        self.e2 = []
+        self.chunks = []
+        self.offsets = []
+        self.latent_type = None
+        self.num_chunks = 0
+
+    def add_batch(self, texts, labels, predictions, e1, e2, alphas, e1_alphas, e2_alphas, latent_type,
+                  self_alphas=None):
+        # self_alphas = (batch, heads, seq_len, seq_len)
+        self.labels += list(labels)
+        self.predictions += list(predictions)
+        self.e1 += list(e1)
+        self.e2 += list(e2)
+        self.chunks += [self.num_chunks] * len(texts)
+        self.offsets += list(range(len(texts)))
+        self.latent_type = latent_type
+
+        arrays = {
+            "texts": np.array(texts, dtype=np.str_),
+            "alphas": alphas.astype(np.float16),
+            "e1_alphas": e1_alphas.astype(np.float32),
+            "e2_alphas": e2_alphas.astype(np.float32),
+        }
+        if self_alphas is not None:
+            cropped = []
+            for text, example_alphas in zip(texts, self_alphas):
+                n = min(len(text.split()), example_alphas.shape[-1])
+                cropped.append(example_alphas[:, :n, :n].astype(np.float16))
+            arrays["self_alphas"] = np.concatenate([a.ravel() for a in cropped])
+            arrays["self_alphas_offsets"] = np.concatenate([[0], np.cumsum([a.size for a in cropped])]).astype(np.int64)
+            arrays["self_alphas_heads"] = np.array([a.shape[0] for a in cropped], dtype=np.int32)
+        np.savez_compressed(os.path.join(self.path, "chunk-{:05d}.npz".format(self.num_chunks)), **arrays)
+        self.num_chunks += 1
+
+    def close(self):
+        np.savez(os.path.join(self.path, "index.npz"),
+                 labels=np.array(self.labels, dtype=np.int8),
+                 predictions=np.array(self.predictions, dtype=np.int8),
+                 e1=np.array(self.e1, dtype=np.int32),
+                 e2=np.array(self.e2, dtype=np.int32),
+                 chunks=np.array(self.chunks, dtype=np.int32),
+                 offsets=np.array(self.offsets, dtype=np.int32),
+                 latent_type=np.asarray(self.latent_type, dtype=np.float32))
+
+
+class AttentionStore:
+    """
+    Read side of AttentionStoreWriter. Selection only reads the index;
+    `example` decompresses the chunk holding that example (the last chunk
+    is kept, so a page of consecutive ids reads each chunk once).
+    """
+    def __init__(self, path):
+        self.path = path
+        with np.load(os.path.join(path, "index.npz")) as index:
+            self.index = {name: index[name] for name in index.files}
+        self._chunk_id = None
+        self._chunk = None
+
+    def __len__(self):
+        return len(self.index["labels"])
+
+    def _get_chunk(self, chunk_id):
+        if chunk_id != self._chunk_id:
+            with np.load(os.path.join(self.path, "chunk-{:05d}.npz".format(chunk_id))) as chunk:
+                self._chunk = {name: chunk[name] for name in chunk.files}
+            self._chunk_id = chunk_id
+        return self._chunk
+
+    def select(self, which="all", relation=None):
+        """
+        Example ids matching `which` ('all', 'misclassified' or 'correct')
+        and, optionally, the gold `relation` (e.g. 'Cause-Effect(e1,e2)').
+        """
+        labels = self.index["labels"]
+        predictions = self.index["predictions"]
+        mask = np.ones(len(labels), dtype=bool)
+        if which == "misclassified":
+            mask &= labels != predictions
+        elif which == "correct":
+            mask &= labels == predictions
+        if relation is not None:
+            mask &= labels == utils.class2label[relation]
+        return np.nonzero(mask)[0]
+
+    def example(self, idx):
+        chunk = self._get_chunk(int(self.index["chunks"][idx]))
+        offset = int(self.index["offsets"][idx])
+        self_alphas = None
+        if "self_alphas" in chunk:
+            offsets = chunk["self_alphas_offsets"]
+            heads = int(chunk["self_alphas_heads"][offset])
+            flat = chunk["self_alphas"][offsets[offset]:offsets[offset + 1]]
+            n = int(round((flat.size / heads) ** 0.5))
+            self_alphas = flat.reshape(heads, n, n).astype(np.float32)
+        return {
+            "id": int(idx),
+            "tokens": str(chunk["texts"][offset]).split(),
+            "label": utils.label2class[int(self.index["labels"][idx])],
+            "prediction": utils.label2class[int(self.index["predictions"][idx])],
+            "e1": int(self.index["e1"][idx]),
+            "e2": int(self.index["e2"][idx]),
+            "alphas": chunk["alphas"][offset].astype(np.float32),
+            "e1_alphas": chunk["e1_alphas"][offset],
+            "e2_alphas": chunk["e2_alphas"][offset],
+            "self_alphas": self_alphas,
+        }
@@ -0,0 +1,50 @@
+import os
+import time
+import numpy as np
+
+import data_helpers
+from configure import parse_args
+from logger import official_f1
+from predict import Predictor
+
+
+def benchmark(config):
+    """
+    Reports test F1 against single-sentence p50/p99 latency for each
+    checkpoint in the comma separated `--checkpoint_dir`, e.g. a trained
+    EntityAttentionLSTM teacher and its distilled EntityAttentionCNN student.
+    """
+    test_text, test_y, test_e1, test_e2, _, _ = data_helpers.load_data_and_labels(config.test_path,
+                                                                                  config.max_sentence_length,
+                                                                                  entity_markers=not config.marker_free,
+                                                                                  entity_window=config.entity_window)
+    examples = [(text.split(), e1, e2) for text, e1, e2 in zip(test_text, test_e1, test_e2)]
+
+    results = []
+    for checkpoint_dir in config.checkpoint_dir.split(","):
+        predictor = Predictor(checkpoint_dir, config)
+        # Warm-up: restores the graph and runs the first (slow) session call
+        predictor.predict_preprocessed(examples[:config.batch_size])
+
+        start = time.perf_counter()
+        predictions = predictor.predict_preprocessed(examples)
+        throughput = len(examples) / (time.perf_counter() - start)
+        prediction_path = os.path.abspath(os.path.join(checkpoint_dir, "..", "benchmark_predictions.txt"))
+        f1_score = official_f1(predictions, prediction_path)
+
+        # Serving latency: one request = one sentence
+        latencies = []
+        for example in examples[:config.latency_samples]:
+            start = time.perf_counter()
+            predictor.predict_preprocessed([example])
+            latencies.append((time.perf_counter() - start) * 1000)
+        results.append((checkpoint_dir, f1_score, np.percentile(latencies, 50), np.percentile(latencies, 99),
+                        throughput))
+
+    print("\n{:<50} {:>8} {:>10} {:>10} {:>12}".format("checkpoint", "F1(%)", "p50(ms)", "p99(ms)", "sents/sec"))
+    for checkpoint_dir, f1_score, p50, p99, throughput in results:
+        print("{:<50} {:>8.2f} {:>10.2f} {:>10.2f} {:>12.1f}".format(checkpoint_dir, f1_score, p50, p99, throughput))
+
+
+if __name__ == "__main__":
+    benchmark(parse_args())
@@ -0,0 +1,88 @@
+import os
+import io
+import json
+import threading
+import numpy as np
+
+
+class ResumeCheckpoint:
+    """
+    Lightweight periodic checkpoint for resuming an interrupted run.
+
+    Variable values (model weights, optimizer slots and global_step) are
+    snapshotted with a single `sess.run` on the training thread, then written
+    to a single .npz together with a JSON training state (data order, best
+    F1, ...). Writing happens on a background thread when `async_write` is
+    set, so training only pays for the snapshot; a failed write is raised
+    by the next `save` or `wait`. The file is replaced atomically, so a crash
+    mid-write leaves the previous checkpoint intact.
+    """
+    def __init__(self, checkpoint_dir, var_list, async_write=True):
+        self.checkpoint_dir = os.path.abspath(checkpoint_dir)
+        if not os.path.exists(self.checkpoint_dir):
+            os.makedirs(self.checkpoint_dir)
+        self.weights_path = os.path.join(self.checkpoint_dir, "resume.npz")
+        self.var_list = list(var_list)
+        self.async_write = async_write
+        self.error = None
+        self._thread = None
+
+    def exists(self):
+        return os.path.exists(self.weights_path)
+
+    def save(self, sess, state):
+        values = sess.run(self.var_list)
+        state = dict(state, variables=[v.name for v in self.var_list])
+        # At most one write in flight: the next snapshot waits for the previous one
+        self.wait()
+        if self.async_write:
+            self._thread = threading.Thread(target=self._write_in_background, args=(values, state))
+            self._thread.daemon = True
+            self._thread.start()
+        else:
+            self._write(values, state)
+
+    def wait(self):
+        """
+        Wait for the write in flight; re-raises the error of a failed
+        background write (disk full, permissions, ...).
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def restore(self, sess):
+        """
+        Load the saved variables into `sess` and return the training state,
+        or None if there is nothing to resume from.
+        """
+        if not self.exists():
+            return None
+        weights = np.load(self.weights_path)
+        state = json.loads(str(weights["state"]))
+        var_by_name = {v.name: v for v in self.var_list}
+        for i, name in enumerate(state["variables"]):
+            if name not in var_by_name:
+                raise ValueError("Checkpoint variable {} is not in the current graph".format(name))
+            var_by_name[name].load(weights["v{}".format(i)], sess)
+        return state
+
+    def _write_in_background(self, values, state):
+        try:
+            self._write(values, state)
+        except Exception as e:
+            self.error = e
+
+    def _write(self, values, state):
+        buffer = io.BytesIO()
+        arrays = {"v{}".format(i): value for i, value in enumerate(values)}
+        np.savez(buffer, state=np.array(json.dumps(state)), **arrays)
+        tmp_path = self.weights_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.weights_path)
@@ -2,9 +2,9 @@ import argparse
 import sys
 
 
-def parse_args():
+def build_parser():
     """
-    Parse input arguments
+    Build the argument parser shared by every entry point
     """
     parser = argparse.ArgumentParser()
 
@@ -15,8 +15,14 @@ def parse_args():
                         type=str, help="Path of test data")
     parser.add_argument("--max_sentence_length", default=90,
                         type=int, help="Max sentence length in data")
+    parser.add_argument("--entity_window", default=0,
+                        type=int, help="Crop sentences to this many tokens around each entity, 0 to disable (default: 0)")
+    parser.add_argument("--marker_free", action="store_true",
+                        help="Drop the <e1>/<e2> marker tokens from the input (allows a shared encoder pass per sentence)")
 
     # Model Hyper-parameters
+    parser.add_argument("--model", default="lstm", choices=["lstm", "cnn"],
+                        type=str, help="Encoder {'lstm': EntityAttentionLSTM, 'cnn': low-latency EntityAttentionCNN}")
     # Embeddings
     parser.add_argument("--embeddings", default=None,
                         type=str, help="Embeddings {'word2vec', 'glove100', 'glove300', 'elmo'}")
@@ -31,6 +37,11 @@ def parse_args():
                         type=int, help="Dimensionality of RNN hidden (default: 300)")
     parser.add_argument("--rnn_dropout_keep_prob", default=0.7,
                         type=float, help="Dropout keep probability of RNN (default: 0.7)")
+    # CNN (--model cnn)
+    parser.add_argument("--num_conv_layers", default=2,
+                        type=int, help="Number of gated convolution layers (default: 2)")
+    parser.add_argument("--kernel_size", default=3,
+                        type=int, help="Width of the convolution kernels (default: 3)")
     # Attention
     parser.add_argument("--num_heads", default=4,
                         type=int, help="Number of heads in multi-head attention (default: 4)")
@@ -51,14 +62,42 @@ def parse_args():
                         type=int, help="Number of training epochs (Default: 100)")
     parser.add_argument("--display_every", default=10,
                         type=int, help="Number of iterations to display training information")
+    parser.add_argument("--summary_every", default=10,
+                        type=int, help="Write train summaries after this many steps, 0 to disable (default: 10)")
+    parser.add_argument("--log_flush_secs", default=5.0,
+                        type=float, help="Flush logs and summaries from the background writer at most this often, 0 to flush every write (default: 5)")
     parser.add_argument("--evaluate_every", default=100,
                         type=int, help="Evaluate model on dev set after this many steps (default: 100)")
+    parser.add_argument("--eval_batch_size", default=0,
+                        type=int, help="Evaluation batch size, 0 to fit it to --eval_memory_mb (default: 0)")
+    parser.add_argument("--eval_memory_mb", default=512,
+                        type=int, help="Activation memory budget of an evaluation batch in MB (default: 512)")
     parser.add_argument("--num_checkpoints", default=5,
                         type=int, help="Number of checkpoints to store (default: 5)")
     parser.add_argument("--learning_rate", default=1.0,
                         type=float, help="Which learning rate to start with (Default: 1.0)")
     parser.add_argument("--decay_rate", default=0.9,
                         type=float, help="Decay rate for learning rate (Default: 0.9)")
+    parser.add_argument("--teacher_dir", default=None,
+                        type=str, help="Checkpoint dir of a trained model to distill from (default: no distillation)")
+    parser.add_argument("--distill_temperature", default=2.0,
+                        type=float, help="Softmax temperature of distillation (default: 2.0)")
+    parser.add_argument("--distill_alpha", default=0.5,
+                        type=float, help="Weight of the distillation loss vs. the label loss (default: 0.5)")
+    parser.add_argument("--seed", default=None,
+                        type=int, help="Seed of the data order (default: random, saved for --resume)")
+    parser.add_argument("--checkpoint_every", default=500,
+                        type=int, help="Write a resume checkpoint after this many steps, 0 to disable (default: 500)")
+    parser.add_argument("--no_async_checkpoint", dest="async_checkpoint", action="store_false",
+                        help="Write resume checkpoints synchronously instead of on a background thread")
+    parser.add_argument("--resume", default=None,
+                        type=str, help="Continue training the run in this directory (e.g. runs/1550000000)")
+    parser.add_argument("--num_folds", default=5,
+                        type=int, help="Number of folds of cross_validate.py (default: 5)")
+    parser.add_argument("--cv_workers", default=2,
+                        type=int, help="Number of folds trained concurrently (default: 2)")
+    parser.add_argument("--cv_threads_per_fold", default=0,
+                        type=int, help="CPU threads pinned to each fold, 0 to split all cores evenly (default: 0)")
 
     # Misc Parameters
     parser.add_argument("--allow_soft_placement", default=True,
@@ -72,16 +111,58 @@ def parse_args():
     parser.add_argument("--checkpoint_dir", default=None,
                         type=str, help="Visualize this checkpoint")
 
+    parser.add_argument("--attention_path", default=None,
+                        type=str, help="Attention weights store directory (default: <checkpoint_dir>/../attention)")
+    parser.add_argument("--select", default="all", choices=["all", "misclassified", "correct"],
+                        type=str, help="Examples rendered by render_attention.py (default: all)")
+    parser.add_argument("--relation", default=None,
+                        type=str, help="Only render examples of this gold relation, e.g. 'Cause-Effect(e1,e2)'")
+    parser.add_argument("--example_ids", default=None,
+                        type=str, help="Comma separated example ids to render (overrides --select)")
+    parser.add_argument("--page", default=0,
+                        type=int, help="Page of the selected examples to render (default: 0)")
+    parser.add_argument("--page_size", default=50,
+                        type=int, help="Number of examples per rendered page (default: 50)")
+    parser.add_argument("--html_path", default="visualization.html",
+                        type=str, help="Output of render_attention.py (default: visualization.html)")
+
+    # Prediction Parameters
+    parser.add_argument("--predict_path", default=None,
+                        type=str, help="Sentences with <e1>/<e2> markers to predict, one per line")
+    parser.add_argument("--cache_size", default=0,
+                        type=int, help="Number of predictions kept in the in-memory LRU cache, 0 to disable (default: 0)")
+    parser.add_argument("--cache_dir", default=None,
+                        type=str, help="Directory of the on-disk prediction cache tier (default: disabled)")
+    parser.add_argument("--extend_path", default=None,
+                        type=str, help="New domain text whose words extend the vocabulary of --checkpoint_dir")
+    parser.add_argument("--pairs_path", default=None,
+                        type=str, help="JSON lines of marker-free sentences with entity spans for predict_pairs.py")
+    parser.add_argument("--export_dir", default=None,
+                        type=str, help="Output of export_weights.py (default: <run>/numpy_model)")
+    parser.add_argument("--no_verify_export", dest="verify_export", action="store_false",
+                        help="Skip checking the exported NumPy model against the TF graph on the test set")
+    parser.add_argument("--latency_samples", default=500,
+                        type=int, help="Number of single-sentence requests timed by benchmark.py (default: 500)")
+
+    return parser
+
+
+def parse_args(argv=None):
+    """
+    Parse input arguments
+
+    Nothing is parsed at import time: entry points call this explicitly and
+    pass the resulting config object down to the library modules.
+    """
+    parser = build_parser()
     if len(sys.argv) == 0:
         parser.print_help()
         sys.exit(1)
 
     print("")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     for arg in vars(args):
         print("{}={}".format(arg.upper(), getattr(args, arg)))
     print("")
 
     return args
-
-FLAGS = parse_args()
@@ -0,0 +1,169 @@
+import os
+import time
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+
+import data_helpers
+import utils
+from configure import parse_args
+
+
+def stratified_folds(labels, num_folds, seed=None):
+    """
+    Assigns every example to one of `num_folds` folds, spreading each
+    relation evenly over the folds. Returns a fold id per example.
+    """
+    rng = np.random.RandomState(seed)
+    folds = np.zeros(len(labels), dtype=np.int32)
+    for label in np.unique(labels):
+        idx = np.nonzero(labels == label)[0]
+        rng.shuffle(idx)
+        folds[idx] = (np.arange(len(idx)) + rng.randint(num_folds)) % num_folds
+    return folds
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(multiprocessing.cpu_count()))
+
+
+def cpu_slots(num_workers, threads_per_fold):
+    """
+    Disjoint CPU sets of `threads_per_fold` CPUs, one per worker (empty sets
+    when affinity is not available on this platform, i.e. no pinning).
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return [[] for _ in range(num_workers)]
+    cpus = available_cpus()
+    if num_workers * threads_per_fold > len(cpus):
+        raise ValueError("{} workers x {} threads do not fit on {} CPUs, lower --cv_workers or "
+                         "--cv_threads_per_fold".format(num_workers, threads_per_fold, len(cpus)))
+    return [cpus[i * threads_per_fold:(i + 1) * threads_per_fold] for i in range(num_workers)]
+
+
+def _init_worker(slots):
+    # Each pool process takes one CPU set for its whole life
+    cpus = slots.get()
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+
+def train_fold(config, cv_dir, fold, threads):
+    from train import fit
+
+    data = np.load(os.path.join(cv_dir, "dataset.npz"))
+    vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(os.path.join(cv_dir, "vocab"))
+    pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(os.path.join(cv_dir, "pos_vocab"))
+
+    names = ["x", "y", "text", "e1", "e2", "p1", "p2"]
+    train_mask = data["folds"] != fold
+    train_data = tuple(data[name][train_mask] for name in names)
+    dev_data = tuple(data[name][~train_mask] for name in names)
+
+    session_conf = tf.ConfigProto(
+        allow_soft_placement=config.allow_soft_placement,
+        log_device_placement=config.log_device_placement,
+        intra_op_parallelism_threads=threads,
+        inter_op_parallelism_threads=1)
+    session_conf.gpu_options.allow_growth = config.gpu_allow_growth
+
+    out_dir = os.path.join(cv_dir, "fold-{}".format(fold))
+    print("\nFold {}: train = {}, dev = {}, writing to {}\n".format(fold, len(train_data[0]), len(dev_data[0]),
+                                                                   out_dir))
+    pretrain_W = data["pretrain_W"] if "pretrain_W" in data.files else None
+    final_f1 = fit(config, train_data, dev_data, vocab_processor, pos_vocab_processor, out_dir,
+                   target_path=os.path.join(cv_dir, "target-{}.txt".format(fold)), session_conf=session_conf,
+                   pretrain_W=pretrain_W)
+    return fold, final_f1
+
+
+def cross_validate(config):
+    """
+    k-fold cross-validation on `--train_path`.
+
+    The file is preprocessed, vocab-encoded and matched with the pre-trained
+    embeddings once into runs/cv-<ts>/, split into stratified folds, and the
+    folds are trained `--cv_workers` at a time, each worker pinned to its own
+    `--cv_threads_per_fold` CPUs. Every fold is scored on its held-out part
+    with the official scorer, using the model at the end of training: the
+    best F1 over the periodic evaluations would use the held-out fold for
+    model selection too, and bias the estimate upward.
+    """
+    if config.resume or config.teacher_dir:
+        raise ValueError("--resume and --teacher_dir are not supported with cross-validation")
+    num_workers = max(1, min(config.cv_workers, config.num_folds))
+    threads = config.cv_threads_per_fold or max(1, len(available_cpus()) // num_workers)
+    # Fail before preprocessing if the folds cannot get disjoint CPUs
+    slot_cpus = cpu_slots(num_workers, threads)
+
+    text, y, e1, e2, pos1, pos2 = data_helpers.load_data_and_labels(config.train_path, config.max_sentence_length, entity_markers=not config.marker_free, entity_window=config.entity_window)
+    vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor(config.max_sentence_length)
+    vocab_processor.fit(text)
+    pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor(config.max_sentence_length)
+    pos_vocab_processor.fit(pos1 + pos2)
+    labels = np.argmax(y, axis=1)
+    folds = stratified_folds(labels, config.num_folds, config.seed)
+    # Read the word2vec/GloVe file once; every fold starts from the same matrix
+    pretrain_W = utils.load_pretrained_embeddings(config.embeddings, config.embedding_size, vocab_processor)
+    extra = {} if pretrain_W is None else {"pretrain_W": pretrain_W.astype(np.float32)}
+
+    timestamp = str(int(time.time()))
+    cv_dir = os.path.abspath(os.path.join(os.path.curdir, "runs", "cv-" + timestamp))
+    os.makedirs(cv_dir)
+    vocab_processor.save(os.path.join(cv_dir, "vocab"))
+    pos_vocab_processor.save(os.path.join(cv_dir, "pos_vocab"))
+    np.savez(os.path.join(cv_dir, "dataset.npz"),
+             x=np.array(list(vocab_processor.transform(text))),
+             y=y,
+             text=np.array(text),
+             e1=np.array(e1),
+             e2=np.array(e2),
+             p1=np.array(list(pos_vocab_processor.transform(pos1))),
+             p2=np.array(list(pos_vocab_processor.transform(pos2))),
+             folds=folds,
+             **extra)
+    # Answer key of each fold, in the format of resource/target.txt
+    for fold in range(config.num_folds):
+        with open(os.path.join(cv_dir, "target-{}.txt".format(fold)), "w") as f:
+            f.write("".join("{}\t{}\n".format(i, utils.label2class[label])
+                            for i, label in enumerate(labels[folds == fold])))
+    print("\nText Vocabulary Size: {:d}".format(len(vocab_processor.vocabulary_)))
+    print("Folds: {} x ~{} examples, {} workers x {} threads".format(config.num_folds, len(labels) // config.num_folds,
+                                                                      num_workers, threads))
+    print("Writing to {}\n".format(cv_dir))
+
+    # Folds must not inherit this process's TensorFlow state
+    ctx = multiprocessing.get_context("spawn")
+    slots = ctx.Queue()
+    for cpus in slot_cpus:
+        slots.put(cpus)
+    pool = ctx.Pool(num_workers, initializer=_init_worker, initargs=(slots,))
+    try:
+        results = [pool.apply_async(train_fold, (config, cv_dir, fold, threads))
+                   for fold in range(config.num_folds)]
+        scores = dict(result.get() for result in results)
+    finally:
+        pool.close()
+        pool.join()
+
+    f1 = np.array([scores[fold] for fold in range(config.num_folds)])
+    summary = "F1 of the final model of each fold ({} epochs) on its held-out fold, official scorer\n".format(
+        config.num_epochs)
+    summary += "".join("fold {}: F1 = {:g}%\n".format(fold, score) for fold, score in enumerate(f1))
+    summary += "{}-fold F1: mean = {:g}%, variance = {:g}, std = {:g}\n".format(
+        config.num_folds, f1.mean(), f1.var(ddof=1) if len(f1) > 1 else 0.0,
+        f1.std(ddof=1) if len(f1) > 1 else 0.0)
+    with open(os.path.join(cv_dir, "cv_results.txt"), "w") as f:
+        f.write(summary)
+    print("\n" + summary)
+    return f1
+
+
+def main(_):
+    cross_validate(parse_args())
+
+
+if __name__ == "__main__":
+    tf.app.run()
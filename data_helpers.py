@@ -1,10 +1,7 @@
 import numpy as np
-import pandas as pd
-import nltk
 import re
 
 import utils
-from configure import FLAGS
 
 
 def clean_str(text):
@@ -46,47 +43,121 @@ def clean_str(text):
     return text.strip()
 
 
-def load_data_and_labels(path):
+def tokenize(sentence):
+    """
+    Cleans and tokenizes a raw sentence the way the training data is,
+    turning <e1>/<e2> markers (if any) into marker tokens.
+    """
+    sentence = sentence.replace('<e1>', ' _e11_ ')
+    sentence = sentence.replace('</e1>', ' _e12_ ')
+    sentence = sentence.replace('<e2>', ' _e21_ ')
+    sentence = sentence.replace('</e2>', ' _e22_ ')
+
+    # nltk pulls in sklearn (nltk.classify.scikitlearn), so import it on first use
+    import nltk
+
+    sentence = clean_str(sentence)
+    return nltk.word_tokenize(sentence)
+
+
+def preprocess_sentence(sentence, entity_markers=True, entity_window=0):
+    """
+    Normalizes a raw sentence with <e1>/<e2> markers.
+    Returns the tokens and the indices of the last word of each entity.
+    With `entity_markers=False` the marker tokens are dropped from the output.
+    """
+    tokens, e1, e2, _ = preprocess_tokens(tokenize(sentence), entity_markers, entity_window)
+    return tokens, e1, e2
+
+
+def preprocess_tokens(tokens, entity_markers=True, entity_window=0):
+    """
+    Same as preprocess_sentence on tokens that still contain the marker
+    tokens; also returns whether the entity window cropped the sentence.
+    """
+    cropped = False
+    if entity_window > 0:
+        tokens, cropped = crop_entity_window(tokens, entity_window)
+    e1 = tokens.index("e12") - 1
+    e2 = tokens.index("e22") - 1
+    if not entity_markers:
+        tokens, e1, e2 = strip_entity_markers(tokens, e1, e2)
+    return tokens, e1, e2, cropped
+
+
+def crop_entity_window(tokens, window):
+    """
+    Keeps `window` tokens on each side of both entities (markers included)
+    and drops the rest, so the length is bounded by the entity lengths plus
+    4 * `window` whatever the sentence length. Tokens between the entities
+    are kept unless the gap is longer than 2 * `window`.
+    """
+    keep = set()
+    for begin_marker, end_marker in (("e11", "e12"), ("e21", "e22")):
+        begin = max(0, tokens.index(begin_marker) - window)
+        end = min(len(tokens), tokens.index(end_marker) + window + 1)
+        keep.update(range(begin, end))
+    if len(keep) == len(tokens):
+        return tokens, False
+    return [tokens[idx] for idx in sorted(keep)], True
+
+
+MARKER_TOKENS = ("e11", "e12", "e21", "e22")
+
+
+def strip_entity_markers(tokens, e1, e2):
+    """
+    Removes the marker tokens and re-indexes e1/e2. Marker-free sentences
+    encode the same way for every entity pair, which lets the encoder be
+    shared between pairs (see NumpyEntityAttention.predict_pairs).
+    """
+    kept = []
+    new_index = {}
+    for idx, token in enumerate(tokens):
+        if token in MARKER_TOKENS:
+            continue
+        new_index[idx] = len(kept)
+        kept.append(token)
+    return kept, new_index[e1], new_index[e2]
+
+
+def load_data_and_labels(path, max_sentence_length=90, entity_markers=True, entity_window=0):
+    """
+    Loads a SemEval file. `max_sentence_length` is the padded length used for
+    the relative positions (pass `config.max_sentence_length`). With an
+    `entity_window`, each sentence is cropped around its entities first.
+    """
     data = []
     lines = [line.strip() for line in open(path)]
-    max_sentence_length = 0
+    longest_sentence = 0
+    num_cropped = 0
+    num_truncated = 0
     for idx in range(0, len(lines), 4):
         id = lines[idx].split("\t")[0]
         relation = lines[idx + 1]
 
         sentence = lines[idx].split("\t")[1][1:-1]
-        sentence = sentence.replace('<e1>', ' _e11_ ')
-        sentence = sentence.replace('</e1>', ' _e12_ ')
-        sentence = sentence.replace('<e2>', ' _e21_ ')
-        sentence = sentence.replace('</e2>', ' _e22_ ')
-
-        sentence = clean_str(sentence)
-        tokens = nltk.word_tokenize(sentence)
-        if max_sentence_length < len(tokens):
-            max_sentence_length = len(tokens)
-        e1 = tokens.index("e12") - 1
-        e2 = tokens.index("e22") - 1
+        tokens, e1, e2, cropped = preprocess_tokens(tokenize(sentence), entity_markers, entity_window)
+        num_cropped += cropped
+        num_truncated += max(e1, e2) >= max_sentence_length
+        if longest_sentence < len(tokens):
+            longest_sentence = len(tokens)
         sentence = " ".join(tokens)
 
-        data.append([id, sentence, e1, e2, relation])
+        data.append((id, sentence, e1, e2, relation))
 
     print(path)
-    print("max sentence length = {}\n".format(max_sentence_length))
-
-    df = pd.DataFrame(data=data, columns=["id", "sentence", "e1", "e2", "relation"])
+    print("max sentence length = {}".format(longest_sentence))
+    if entity_window > 0:
+        print("cropped to entity window of {} = {}/{}".format(entity_window, num_cropped, len(data)))
+    print("entity beyond max_sentence_length = {}/{}\n".format(num_truncated, len(data)))
 
-    pos1, pos2 = get_relative_position(df, FLAGS.max_sentence_length)
+    _, x_text, e1, e2, relations = (list(column) for column in zip(*data))
 
-    df['label'] = [utils.class2label[r] for r in df['relation']]
-
-    # Text Data
-    x_text = df['sentence'].tolist()
-    e1 = df['e1'].tolist()
-    e2 = df['e2'].tolist()
+    pos1, pos2 = get_relative_position(x_text, e1, e2, max_sentence_length)
 
     # Label Data
-    y = df['label']
-    labels_flat = y.values.ravel()
+    labels_flat = np.array([utils.class2label[r] for r in relations])
     labels_count = np.unique(labels_flat).shape[0]
 
     # convert class labels from scalars to one-hot vectors
@@ -107,42 +178,54 @@ def load_data_and_labels(path):
     return x_text, labels, e1, e2, pos1, pos2
 
 
-def get_relative_position(df, max_sentence_length):
+def get_relative_position(sentences, e1s, e2s, max_sentence_length):
+    import nltk
+
     # Position data
     pos1 = []
     pos2 = []
-    for df_idx in range(len(df)):
-        sentence = df.iloc[df_idx]['sentence']
+    for sentence, e1, e2 in zip(sentences, e1s, e2s):
         tokens = nltk.word_tokenize(sentence)
-        e1 = df.iloc[df_idx]['e1']
-        e2 = df.iloc[df_idx]['e2']
-
-        p1 = ""
-        p2 = ""
-        for word_idx in range(len(tokens)):
-            p1 += str((max_sentence_length - 1) + word_idx - e1) + " "
-            p2 += str((max_sentence_length - 1) + word_idx - e2) + " "
+
+        p1, p2 = relative_position(len(tokens), e1, e2, max_sentence_length)
         pos1.append(p1)
         pos2.append(p2)
 
     return pos1, pos2
 
 
-def batch_iter(data, batch_size, num_epochs, shuffle=True):
+def relative_position(num_tokens, e1, e2, max_sentence_length):
+    p1 = ""
+    p2 = ""
+    for word_idx in range(num_tokens):
+        p1 += str((max_sentence_length - 1) + word_idx - e1) + " "
+        p2 += str((max_sentence_length - 1) + word_idx - e2) + " "
+    return p1, p2
+
+
+def batch_iter(data, batch_size, num_epochs, shuffle=True, seed=None, start_epoch=0, start_batch=0):
     """
     Generates a batch iterator for a dataset.
+
+    With a `seed`, the order of each epoch depends only on (seed, epoch), so a
+    resumed run can continue from (`start_epoch`, `start_batch`) and see
+    exactly the batches the interrupted run would have seen.
     """
     data = np.array(data)
     data_size = len(data)
     num_batches_per_epoch = int((len(data) - 1) / batch_size) + 1
-    for epoch in range(num_epochs):
+    for epoch in range(start_epoch, num_epochs):
         # Shuffle the data at each epoch
         if shuffle:
-            shuffle_indices = np.random.permutation(np.arange(data_size))
+            if seed is None:
+                shuffle_indices = np.random.permutation(np.arange(data_size))
+            else:
+                shuffle_indices = np.random.RandomState(seed + epoch).permutation(np.arange(data_size))
             shuffled_data = data[shuffle_indices]
         else:
             shuffled_data = data
-        for batch_num in range(num_batches_per_epoch):
+        first_batch = start_batch if epoch == start_epoch else 0
+        for batch_num in range(first_batch, num_batches_per_epoch):
             start_index = batch_num * batch_size
             end_index = min((batch_num + 1) * batch_size, data_size)
             yield shuffled_data[start_index:end_index]
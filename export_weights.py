@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import numpy as np
+import tensorflow as tf
+
+import data_helpers
+import utils
+from configure import parse_args
+from predict import Predictor, latest_checkpoint
+from numpy_model import NumpyEntityAttention
+
+
+def export_weights(config):
+    """
+    Writes the weights and vocabularies of the latest checkpoint in
+    `--checkpoint_dir` to `--export_dir` (default: <run>/numpy_model) for
+    NumpyEntityAttention. Optimizer slots and the global step are skipped.
+    """
+    run_dir = os.path.join(config.checkpoint_dir, "..")
+    export_dir = config.export_dir or os.path.join(run_dir, "numpy_model")
+    if not os.path.exists(export_dir):
+        os.makedirs(export_dir)
+
+    checkpoint_file = latest_checkpoint(config.checkpoint_dir)
+    reader = tf.train.NewCheckpointReader(checkpoint_file)
+    names = sorted(name for name in reader.get_variable_to_shape_map()
+                   if "Adadelta" not in name and name != "global_step")
+    if any(name.startswith("elmo-embeddings") for name in names):
+        raise ValueError("ELMo models cannot be exported to NumPy")
+
+    vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(os.path.join(run_dir, "vocab"))
+    pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(os.path.join(run_dir, "pos_vocab"))
+    vocab = vocab_processor.vocabulary_
+    pos_vocab = pos_vocab_processor.vocabulary_
+    # The head count is not recoverable from the weights, so it must come from the run
+    hparams = utils.load_hparams(run_dir)
+    if hparams is None:
+        if not config.verify_export:
+            raise ValueError("{} has no hparams.json: export with verification so that "
+                             "--num_heads/--marker_free are checked against the TF graph".format(run_dir))
+        hparams = {"num_heads": config.num_heads, "marker_free": config.marker_free}
+    meta = {
+        "checkpoint": os.path.basename(checkpoint_file),
+        "model": "lstm" if any(name.startswith("bi-lstm/") for name in names) else "cnn",
+        "num_heads": hparams["num_heads"],
+        "max_sentence_length": vocab_processor.max_document_length,
+        "marker_free": hparams["marker_free"],
+        "variables": names,
+        "vocab": [vocab.reverse(i) for i in range(len(vocab))],
+        "pos_vocab": [pos_vocab.reverse(i) for i in range(len(pos_vocab))],
+    }
+    np.savez(os.path.join(export_dir, "weights.npz"),
+             **{"v{}".format(i): reader.get_tensor(name) for i, name in enumerate(names)})
+    with open(os.path.join(export_dir, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    print("Exported {} variables of {} to {}\n".format(len(names), checkpoint_file, export_dir))
+
+    if config.verify_export:
+        verify(config, export_dir)
+
+
+def verify(config, export_dir):
+    """
+    Compares NumpyEntityAttention with the TF graph on the test set.
+    """
+    test_text, _, test_e1, test_e2, _, _ = data_helpers.load_data_and_labels(config.test_path,
+                                                                              config.max_sentence_length,
+                                                                              entity_markers=not config.marker_free,
+                                                                              entity_window=config.entity_window)
+    examples = [(text.split(), e1, e2) for text, e1, e2 in zip(test_text, test_e1, test_e2)]
+
+    predictor = Predictor(config.checkpoint_dir, config)
+    x, text, e1, e2, p1, p2 = predictor.transform(examples)
+    start = time.perf_counter()
+    numpy_model = NumpyEntityAttention(export_dir)
+    print("NumPy model loaded in {:.1f} ms".format((time.perf_counter() - start) * 1000))
+    np_x, np_e1, np_e2, np_p1, np_p2 = numpy_model.transform(examples)
+    if not (np.array_equal(x, np_x) and np.array_equal(p1, np_p1) and np.array_equal(p2, np_p2)):
+        raise ValueError("NumPy vocabulary transform differs from the VocabularyProcessors")
+
+    max_diff = 0.0
+    agree = 0
+    tf_time = np_time = 0.0
+    for start in range(0, len(examples), config.batch_size):
+        end = start + config.batch_size
+        t = time.perf_counter()
+        tf_logits = predictor.run(predictor.logits, x[start:end], text[start:end], e1[start:end], e2[start:end],
+                                  p1[start:end], p2[start:end])
+        tf_time += time.perf_counter() - t
+        t = time.perf_counter()
+        np_logits = numpy_model.logits(np_x[start:end], np_e1[start:end], np_e2[start:end],
+                                       np_p1[start:end], np_p2[start:end])
+        np_time += time.perf_counter() - t
+        max_diff = max(max_diff, float(np.abs(tf_logits - np_logits).max()))
+        agree += int((tf_logits.argmax(axis=1) == np_logits.argmax(axis=1)).sum())
+
+    print("max |logits_tf - logits_numpy| = {:g}".format(max_diff))
+    print("prediction agreement = {}/{}".format(agree, len(examples)))
+    print("forward time: tf {:.2f}s, numpy {:.2f}s".format(tf_time, np_time))
+    if max_diff > 1e-3 or agree != len(examples):
+        raise ValueError("NumPy forward pass does not match the TF graph")
+
+
+def main(_):
+    export_weights(parse_args())
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,95 @@
+import os
+import time
+import numpy as np
+import tensorflow as tf
+
+import data_helpers
+import utils
+from configure import parse_args
+from predict import latest_checkpoint
+from train import create_model, create_train_op
+
+
+def extend_vocab(config):
+    """
+    Extends the vocabulary of a trained run with the words of `--extend_path`
+    and writes a new run whose W_text has one extra row per new word.
+
+    Existing word ids are kept, so every other weight of the checkpoint is
+    copied unchanged. New rows are warm-started from `--embeddings`
+    (word2vec/glove) when given; their optimizer slots start at zero.
+    The model flags must match the ones the run was trained with.
+    """
+    if config.embeddings == "elmo":
+        raise ValueError("ELMo models have no word vocabulary to extend")
+    run_dir = os.path.join(config.checkpoint_dir, "..")
+    checkpoint_file = latest_checkpoint(config.checkpoint_dir)
+
+    vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(os.path.join(run_dir, "vocab"))
+    pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(os.path.join(run_dir, "pos_vocab"))
+    old_vocab_size = len(vocab_processor.vocabulary_)
+
+    # One sentence per line, with or without <e1>/<e2> markers
+    new_text = []
+    for line in open(config.extend_path):
+        line = line.strip()
+        if line:
+            new_text.append(" ".join(data_helpers.tokenize(line.split("\t")[-1].strip('"'))))
+    # Unfreeze and fit: unseen words are appended, so existing ids are stable
+    vocab_processor.vocabulary_.freeze(False)
+    vocab_processor.fit(new_text)
+    new_vocab_size = len(vocab_processor.vocabulary_)
+    print("\nText Vocabulary Size: {:d} => {:d} (+{:d})".format(old_vocab_size, new_vocab_size,
+                                                               new_vocab_size - old_vocab_size))
+
+    timestamp = str(int(time.time()))
+    out_dir = os.path.abspath(os.path.join(os.path.curdir, "runs", timestamp))
+    checkpoint_dir = os.path.join(out_dir, "checkpoints")
+    os.makedirs(checkpoint_dir)
+    vocab_processor.save(os.path.join(out_dir, "vocab"))
+    pos_vocab_processor.save(os.path.join(out_dir, "pos_vocab"))
+    utils.save_hparams(out_dir, config)
+    print("Writing to {}\n".format(out_dir))
+
+    # Rows of the new words
+    pretrain_W = utils.load_pretrained_embeddings(config.embeddings, config.embedding_size, vocab_processor)
+    if pretrain_W is not None:
+        new_rows = pretrain_W[old_vocab_size:]
+    else:
+        new_rows = np.random.uniform(-0.25, 0.25, [new_vocab_size - old_vocab_size, config.embedding_size])
+
+    reader = tf.train.NewCheckpointReader(checkpoint_file)
+    with tf.Graph().as_default():
+        sess = tf.Session()
+        with sess.as_default():
+            model = create_model(config,
+                                 sequence_length=config.max_sentence_length,
+                                 num_classes=len(utils.class2label),
+                                 vocab_size=new_vocab_size,
+                                 pos_vocab_size=len(pos_vocab_processor.vocabulary_))
+            global_step, _ = create_train_op(config, model.loss)
+            sess.run(tf.global_variables_initializer())
+
+            for var in tf.global_variables():
+                name = var.op.name
+                if not reader.has_tensor(name):
+                    raise ValueError("{} is not in {} (do the model flags match the run?)".format(name, checkpoint_file))
+                value = reader.get_tensor(name)
+                if value.ndim > 0 and value.shape[0] == old_vocab_size and name.startswith(model.W_text.op.name):
+                    # W_text itself gets the new word vectors, its optimizer slots get zeros
+                    rows = new_rows if name == model.W_text.op.name else np.zeros_like(new_rows)
+                    value = np.concatenate([value, rows.astype(value.dtype)], axis=0)
+                var.load(value, sess)
+
+            saver = tf.train.Saver(tf.global_variables())
+            path = saver.save(sess, os.path.join(checkpoint_dir, "model-extended"),
+                              global_step=sess.run(global_step))
+            print("Saved extended model checkpoint to {}\n".format(path))
+
+
+def main(_):
+    extend_vocab(parse_args())
+
+
+if __name__ == "__main__":
+    tf.app.run()
@@ -0,0 +1,49 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules on the preprocessing-only path (no model, no session)
+PREPROCESSING_MODULES = ["configure", "utils", "data_helpers", "logger"]
+# Modules that must never be pulled in by the path above
+HEAVY_MODULES = ["tensorflow", "tensorflow_hub", "tensor2tensor", "sklearn", "nltk", "pandas"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module):
+    """
+    Import `module` in a fresh interpreter and report its cold import time
+    and any heavy module it dragged in.
+    """
+    probe = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", probe])
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget_ms", default=1500,
+                        type=float, help="Import-time budget per module in ms (default: 1500)")
+    args = parser.parse_args()
+
+    failed = False
+    for module in PREPROCESSING_MODULES:
+        result = measure(module)
+        elapsed_ms = result["seconds"] * 1000
+        ok = elapsed_ms <= args.budget_ms and not result["heavy"]
+        failed = failed or not ok
+        print("{:<14} {:8.1f} ms  heavy={}  {}".format(module, elapsed_ms, result["heavy"] or "-",
+                                                       "OK" if ok else "OVER BUDGET"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
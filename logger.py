@@ -1,60 +1,145 @@
 import subprocess
 import os
+import time
+import queue
 import datetime
+import threading
 
-from configure import FLAGS
 import utils
 
 
+class BackgroundWriter:
+    """
+    Runs file and summary writes on a daemon thread, off the training loop.
+
+    Writes are executed in submission order; the files they touched are
+    flushed together at most every `flush_secs` (and on close), so lines are
+    batched instead of hitting the disk one by one. With `flush_secs=0`
+    every write is flushed right away.
+    """
+    _CLOSE = object()
+
+    def __init__(self, flush_secs=5.0):
+        if flush_secs < 0:
+            raise ValueError("flush_secs must be >= 0, got {}".format(flush_secs))
+        self.flush_secs = flush_secs
+        self.error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, fn, flushable, *args):
+        if self.error is not None:
+            raise self.error
+        self._queue.put((fn, flushable, args))
+
+    def close(self):
+        self._queue.put(self._CLOSE)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        dirty = []
+        last_flush = time.time()
+        closed = False
+        while not closed:
+            try:
+                # Nothing to flush on a timer when every write is flushed at once
+                item = self._queue.get(timeout=self.flush_secs or None)
+            except queue.Empty:
+                item = None
+            if item is self._CLOSE:
+                closed = True
+            elif item is not None:
+                fn, flushable, args = item
+                try:
+                    fn(*args)
+                except Exception as e:
+                    self.error = e
+                if flushable not in dirty:
+                    dirty.append(flushable)
+            if dirty and (closed or time.time() - last_flush >= self.flush_secs):
+                for flushable in dirty:
+                    flushable.flush()
+                dirty = []
+                last_flush = time.time()
+
+
 class Logger:
-    def __init__(self, out_dir):
+    def __init__(self, out_dir, config, resume=False, target_path=None):
+        self.config = config
+        self.target_path = target_path
+        self.writer = BackgroundWriter(config.log_flush_secs)
         self.log_dir = os.path.abspath(os.path.join(out_dir, "logs"))
-        os.makedirs(self.log_dir)
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
         self.log_path = os.path.abspath(os.path.join(self.log_dir, "logs.txt"))
-        self.log_file = open(self.log_path, "w")
+        self.log_file = open(self.log_path, "a" if resume else "w")
 
         self.print_hyperparameters()
 
         self.best_f1 = 0.0
 
+    def write(self, text):
+        self.writer.submit(self.log_file.write, self.log_file, text)
+
+    def add_summary(self, summary_writer, summary, step):
+        self.writer.submit(summary_writer.add_summary, summary_writer, summary, step)
+
+    def close(self):
+        self.writer.close()
+        self.log_file.close()
+
     def print_hyperparameters(self):
-        self.log_file.write("\n================ Hyper-parameters ================\n\n")
-        for arg in vars(FLAGS):
-            self.log_file.write("{}={}\n".format(arg.upper(), getattr(FLAGS, arg)))
-        self.log_file.write("\n==================================================\n\n")
+        self.write("\n================ Hyper-parameters ================\n\n")
+        for arg in vars(self.config):
+            self.write("{}={}\n".format(arg.upper(), getattr(self.config, arg)))
+        self.write("\n==================================================\n\n")
 
     def logging_train(self, step, loss, accuracy):
         time_str = datetime.datetime.now().isoformat()
         log = "{}: step {}, loss {:g}, acc {:g}".format(time_str, step, loss, accuracy)
-        self.log_file.write(log+"\n")
+        self.write(log+"\n")
         print(log)
 
     def logging_eval(self, step, loss, accuracy, predictions):
-        self.log_file.write("\nEvaluation:\n")
+        self.write("\nEvaluation:\n")
         # loss & acc
         time_str = datetime.datetime.now().isoformat()
         log = "{}: step {}, loss {:g}, acc {:g}".format(time_str, step, loss, accuracy)
-        self.log_file.write(log + "\n")
+        self.write(log + "\n")
         print(log)
 
         # f1-score
         prediction_path = os.path.abspath(os.path.join(self.log_dir, "predictions.txt"))
-        prediction_file = open(prediction_path, 'w')
-        for i in range(len(predictions)):
-            prediction_file.write("{}\t{}\n".format(i, utils.label2class[predictions[i]]))
-        prediction_file.close()
-        perl_path = os.path.join(os.path.curdir,
-                                 "SemEval2010_task8_all_data",
-                                 "SemEval2010_task8_scorer-v1.2",
-                                 "semeval2010_task8_scorer-v1.2.pl")
-        target_path = os.path.join(os.path.curdir, "resource", "target.txt")
-        process = subprocess.Popen(["perl", perl_path, prediction_path, target_path], stdout=subprocess.PIPE)
-        str_parse = str(process.communicate()[0]).split("\\n")[-2]
-        idx = str_parse.find('%')
-        f1_score = float(str_parse[idx-5:idx])
+        f1_score = official_f1(predictions, prediction_path, self.target_path)
 
         self.best_f1 = max(self.best_f1, f1_score)
         f1_log = "<<< (9+1)-WAY EVALUATION TAKING DIRECTIONALITY INTO ACCOUNT -- OFFICIAL >>>:\n" \
                  "macro-averaged F1-score = {:g}%, Best = {:g}%\n".format(f1_score, self.best_f1)
-        self.log_file.write(f1_log + "\n")
+        self.write(f1_log + "\n")
         print(f1_log)
+        return f1_score
+
+
+def official_f1(predictions, prediction_path, target_path=None):
+    """
+    Writes `predictions` (label ids) to `prediction_path` and scores them with
+    the official SemEval perl scorer against `target_path` (default: test key).
+    Returns the (9+1)-way macro-averaged F1 with directionality, in %.
+    """
+    if target_path is None:
+        target_path = os.path.join(os.path.curdir, "resource", "target.txt")
+    with open(prediction_path, 'w') as prediction_file:
+        prediction_file.write("".join("{}\t{}\n".format(i, utils.label2class[prediction])
+                                      for i, prediction in enumerate(predictions)))
+    perl_path = os.path.join(os.path.curdir,
+                             "SemEval2010_task8_all_data",
+                             "SemEval2010_task8_scorer-v1.2",
+                             "semeval2010_task8_scorer-v1.2.pl")
+    process = subprocess.Popen(["perl", perl_path, prediction_path, target_path], stdout=subprocess.PIPE)
+    str_parse = str(process.communicate()[0]).split("\\n")[-2]
+    idx = str_parse.find('%')
+    return float(str_parse[idx-5:idx])
@@ -0,0 +1,40 @@
+import tensorflow as tf
+
+from utils import initializer
+from model.attention import layer_norm
+from model.entity_att_base import EntityAttentionModel
+
+
+class EntityAttentionCNN(EntityAttentionModel):
+    """
+    Low-latency variant of EntityAttentionLSTM for CPU serving.
+
+    Keeps the word/position embeddings and the entity-aware attention with
+    latent entity typing, but replaces self-attention + BiLSTM with a stack of
+    residual gated 1D convolutions, which run in parallel over the sequence.
+    Everything but the encoder comes from EntityAttentionModel, so checkpoints
+    of both models are served and evaluated by the same code.
+    """
+    def __init__(self, sequence_length, num_classes,
+                 vocab_size, embedding_size, pos_vocab_size, pos_embedding_size,
+                 hidden_size, attention_size, num_conv_layers=2, kernel_size=3,
+                 use_elmo=False, l2_reg_lambda=0.0):
+        self.build_inputs(sequence_length, num_classes)
+        self.build_embeddings(vocab_size, embedding_size, pos_vocab_size, pos_embedding_size, use_elmo)
+
+        # Gated Convolutional Encoder
+        with tf.variable_scope("conv-encoder"):
+            mask = tf.expand_dims(tf.cast(tf.sign(tf.abs(self.input_x)), tf.float32), -1)  # (batch, seq_len, 1)
+            mask = mask[:, :tf.shape(self.embedded_chars)[1]]
+            h = tf.layers.dense(self.embedded_chars, hidden_size, kernel_initializer=initializer())
+            for i in range(num_conv_layers):
+                with tf.variable_scope("conv-{}".format(i)):
+                    conv = tf.layers.conv1d(h, 2 * hidden_size, kernel_size, padding='same',
+                                            kernel_initializer=initializer())
+                    values, gates = tf.split(conv, 2, axis=-1)
+                    # rnn_dropout_keep_prob (same placeholder as the LSTM) is the dropout of the conv encoder
+                    conv = self.dropout(values * tf.sigmoid(gates), self.rnn_dropout_keep_prob)
+                    h = layer_norm(h + conv) * mask  # (batch, seq_len, hidden)
+            self.encoder_outputs = h
+
+        self.build_output(self.encoder_outputs, num_classes, attention_size, l2_reg_lambda)
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import numpy as np
+
+# Same tokenizer as tf.contrib.learn.preprocessing.VocabularyProcessor
+TOKENIZER_RE = re.compile(r"[A-Z]{2,}(?![a-z])|[A-Z][a-z]+(?=[A-Z])|[\'\w\-]+", re.UNICODE)
+
+
+def softmax(x, axis=-1):
+    exp = np.exp(x - x.max(axis=axis, keepdims=True))
+    return exp / exp.sum(axis=axis, keepdims=True)
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def dense(inputs, kernel, bias=None):
+    outputs = np.matmul(inputs, kernel)
+    if bias is not None:
+        outputs += bias
+    return outputs
+
+
+def layer_norm(inputs, beta, gamma, epsilon=1e-8):
+    mean = inputs.mean(axis=-1, keepdims=True)
+    variance = inputs.var(axis=-1, keepdims=True)
+    normalized = (inputs - mean) / ((variance + epsilon) ** .5)
+    return gamma * normalized + beta
+
+
+def multihead_attention(queries, keys, w, num_heads, scope):
+    # Mirrors model.attention.multihead_attention (dropout_rate=0)
+    N, T_q, C = queries.shape
+    T_k = keys.shape[1]
+    Q = dense(queries, w[scope + "/dense/kernel"], w[scope + "/dense/bias"])  # (N, T_q, C)
+    K = dense(keys, w[scope + "/dense_1/kernel"], w[scope + "/dense_1/bias"])  # (N, T_k, C)
+    V = dense(keys, w[scope + "/dense_2/kernel"], w[scope + "/dense_2/bias"])  # (N, T_k, C)
+
+    # Split heads: (N, h, T, C/h)
+    Q_ = Q.reshape(N, T_q, num_heads, -1).transpose(0, 2, 1, 3)
+    K_ = K.reshape(N, T_k, num_heads, -1).transpose(0, 2, 1, 3)
+    V_ = V.reshape(N, T_k, num_heads, -1).transpose(0, 2, 1, 3)
+
+    outputs = np.matmul(Q_, K_.transpose(0, 1, 3, 2)) / (K_.shape[-1] ** 0.5)  # (N, h, T_q, T_k)
+
+    # Key Masking
+    key_masks = np.sign(np.abs(keys.sum(axis=-1)))[:, None, None, :]  # (N, 1, 1, T_k)
+    outputs = np.where(key_masks == 0, np.float32(-2 ** 32 + 1), outputs)
+
+    alphas = softmax(outputs)
+
+    # Query Masking
+    query_masks = np.sign(np.abs(queries.sum(axis=-1)))[:, None, :, None]  # (N, 1, T_q, 1)
+    alphas = alphas * query_masks
+
+    outputs = np.matmul(alphas, V_)  # (N, h, T_q, C/h)
+    outputs = outputs.transpose(0, 2, 1, 3).reshape(N, T_q, C)
+    outputs = np.maximum(dense(outputs, w[scope + "/dense_3/kernel"], w[scope + "/dense_3/bias"]), 0)
+    outputs += queries
+    return layer_norm(outputs, w[scope + "/layer_norm/Variable"], w[scope + "/layer_norm/Variable_1"]), alphas
+
+
+def reverse_sequence(inputs, lengths):
+    # Same as tf.reverse_sequence(inputs, lengths, seq_axis=1, batch_axis=0)
+    N, T = inputs.shape[:2]
+    idx = np.tile(np.arange(T), (N, 1))
+    idx = np.where(idx < lengths[:, None], lengths[:, None] - 1 - idx, idx)
+    return inputs[np.arange(N)[:, None], idx]
+
+
+def lstm(inputs, lengths, kernel, bias, forget_bias=1.0):
+    # tf.nn.rnn_cell.LSTMCell under dynamic_rnn: gates (i, j, f, o), zero outputs past `lengths`
+    N, T, D = inputs.shape
+    H = bias.shape[0] // 4
+    W_x, W_h = kernel[:D], kernel[D:]
+    x_proj = dense(inputs, W_x, bias)  # (N, T, 4H), one matmul for all time steps
+    h = np.zeros((N, H), dtype=inputs.dtype)
+    c = np.zeros((N, H), dtype=inputs.dtype)
+    outputs = np.zeros((N, T, H), dtype=inputs.dtype)
+    for t in range(int(lengths.max()) if N else 0):
+        i, j, f, o = np.split(x_proj[:, t] + np.matmul(h, W_h), 4, axis=1)
+        new_c = sigmoid(f + forget_bias) * c + sigmoid(i) * np.tanh(j)
+        new_h = sigmoid(o) * np.tanh(new_c)
+        alive = (t < lengths)[:, None]
+        c = np.where(alive, new_c, c)
+        h = np.where(alive, new_h, h)
+        outputs[:, t] = np.where(alive, new_h, 0)
+    return outputs
+
+
+def conv1d_same(inputs, kernel, bias):
+    # tf.layers.conv1d(padding='same')
+    width = kernel.shape[0]
+    T = inputs.shape[1]
+    padded = np.pad(inputs, ((0, 0), ((width - 1) // 2, width // 2), (0, 0)), mode="constant")
+    outputs = bias + sum(np.matmul(padded[:, k:k + T], kernel[k]) for k in range(width))
+    return outputs.astype(inputs.dtype)
+
+
+def latent_type_attention(e1, e2, latent_type):
+    e1_alphas = softmax(np.matmul(e1, latent_type.T))  # (batch, num_type)
+    e2_alphas = softmax(np.matmul(e2, latent_type.T))  # (batch, num_type)
+    return np.matmul(e1_alphas, latent_type), np.matmul(e2_alphas, latent_type), e1_alphas, e2_alphas
+
+
+def attention(inputs, e1, e2, p1, p2, w, sentence_idx=None):
+    # Mirrors model.attention.attention.
+    # With `sentence_idx`, `inputs` holds one encoded row per sentence and
+    # e1/e2/p1/p2 one row per entity pair of sentence `sentence_idx[i]`.
+    if sentence_idx is None:
+        sentence_idx = np.arange(inputs.shape[0])
+    hidden_size = inputs.shape[-1]
+    pos_size = p1.shape[-1]
+    e1_h = inputs[sentence_idx, e1]  # (batch, hidden)
+    e2_h = inputs[sentence_idx, e2]  # (batch, hidden)
+    e1_type, e2_type, e1_alphas, e2_alphas = latent_type_attention(e1_h, e2_h, w["attention/latent_type"])
+    e1_h = np.concatenate([e1_h, e1_type], axis=-1)
+    e2_h = np.concatenate([e2_h, e2_type], axis=-1)
+
+    e_h = dense(np.concatenate([e1_h, e2_h], axis=-1), w["attention/dense/kernel"])  # (batch, attn)
+    # W*[h;p1;p2] = W_h*h + W_p1*p1 + W_p2*p2, the first term is computed once per sentence
+    W_v = w["attention/dense_1/kernel"]
+    v_h = dense(inputs, W_v[:hidden_size])  # (sentences, seq_len, attn)
+    v = v_h[sentence_idx] + dense(p1, W_v[hidden_size:hidden_size + pos_size]) \
+        + dense(p2, W_v[hidden_size + pos_size:])  # (batch, seq_len, attn)
+    v = np.tanh(v + e_h[:, None, :])
+    alphas = softmax(np.matmul(v, w["attention/u_omega"]))  # (batch, seq_len)
+
+    output = np.einsum("bl,blh->bh", alphas, inputs[sentence_idx])  # (batch, hidden)
+    return output, alphas, e1_alphas, e2_alphas
+
+
+class NumpyEntityAttention:
+    """
+    Inference-only NumPy reimplementation of EntityAttentionLSTM (and
+    EntityAttentionCNN) on weights written by export_weights.py.
+
+    Needs neither TensorFlow nor the pickled vocabularies, so a worker
+    starts in milliseconds. All layers are vectorized over the batch; only
+    the LSTM recurrence loops over time steps.
+    """
+    def __init__(self, export_dir):
+        with open(os.path.join(export_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+        weights = np.load(os.path.join(export_dir, "weights.npz"))
+        self.w = {name: weights["v{}".format(i)].astype(np.float32) for i, name in enumerate(meta["variables"])}
+        self.model = meta["model"]
+        self.num_heads = meta["num_heads"]
+        self.max_sentence_length = meta["max_sentence_length"]
+        self.marker_free = meta.get("marker_free", False)
+        self.vocab = {word: i for i, word in enumerate(meta["vocab"])}
+        self.pos_vocab = {position: i for i, position in enumerate(meta["pos_vocab"])}
+        self.num_conv_layers = len([name for name in self.w
+                                    if name.startswith("conv-encoder/conv-") and name.endswith("/conv1d/kernel")])
+
+    def transform(self, examples):
+        """
+        (tokens, e1, e2) examples => padded word ids, e1, e2 and position ids,
+        exactly like the saved VocabularyProcessors.
+        """
+        x = self._word_ids([tokens for tokens, _, _ in examples])
+        e1 = np.array([e1 for _, e1, _ in examples], dtype=np.int64)
+        e2 = np.array([e2 for _, _, e2 in examples], dtype=np.int64)
+        p1 = self._position_ids([len(tokens) for tokens, _, _ in examples], e1)
+        p2 = self._position_ids([len(tokens) for tokens, _, _ in examples], e2)
+        return x, e1, e2, p1, p2
+
+    def transform_pairs(self, sentences):
+        """
+        (tokens, [(e1, e2), ...]) sentences => word ids per sentence, and
+        sentence index, e1, e2 and position ids per entity pair.
+        """
+        x = self._word_ids([tokens for tokens, _ in sentences])
+        sentence_idx = np.array([n for n, (_, pairs) in enumerate(sentences) for _ in pairs], dtype=np.int64)
+        num_tokens = [len(sentences[n][0]) for n in sentence_idx]
+        e1 = np.array([e1 for _, pairs in sentences for e1, _ in pairs], dtype=np.int64)
+        e2 = np.array([e2 for _, pairs in sentences for _, e2 in pairs], dtype=np.int64)
+        return x, sentence_idx, e1, e2, self._position_ids(num_tokens, e1), self._position_ids(num_tokens, e2)
+
+    def _word_ids(self, token_lists):
+        L = self.max_sentence_length
+        x = np.zeros((len(token_lists), L), dtype=np.int64)
+        for n, tokens in enumerate(token_lists):
+            words = TOKENIZER_RE.findall(" ".join(tokens))[:L]
+            x[n, :len(words)] = [self.vocab.get(word, 0) for word in words]
+        return x
+
+    def _position_ids(self, num_tokens, entities):
+        L = self.max_sentence_length
+        p = np.zeros((len(entities), L), dtype=np.int64)
+        for n, (length, e) in enumerate(zip(num_tokens, entities)):
+            positions = range(min(length, L))
+            p[n, :len(positions)] = [self.pos_vocab.get(str((L - 1) + i - e), 0) for i in positions]
+        return p
+
+    def encode(self, x):
+        """
+        Entity-independent part of the network: (batch, seq_len, hidden).
+        """
+        w = self.w
+        embedded_chars = w["word-embeddings/W_text"][x]
+        if self.model == "cnn":
+            mask = np.sign(np.abs(x))[:, :, None].astype(np.float32)
+            h = dense(embedded_chars, w["conv-encoder/dense/kernel"], w["conv-encoder/dense/bias"])
+            for i in range(self.num_conv_layers):
+                scope = "conv-encoder/conv-{}".format(i)
+                conv = conv1d_same(h, w[scope + "/conv1d/kernel"], w[scope + "/conv1d/bias"])
+                values, gates = np.split(conv, 2, axis=-1)
+                h = layer_norm(h + values * sigmoid(gates),
+                               w[scope + "/layer_norm/Variable"], w[scope + "/layer_norm/Variable_1"]) * mask
+            return h
+
+        self_attn, _ = multihead_attention(embedded_chars, embedded_chars, w, self.num_heads,
+                                           scope="self-attention/multihead_attention")
+        lengths = np.sign(np.abs(x)).sum(axis=1)
+        fw = lstm(self_attn, lengths,
+                  w["bi-lstm/bidirectional_rnn/fw/lstm_cell/kernel"], w["bi-lstm/bidirectional_rnn/fw/lstm_cell/bias"])
+        bw = lstm(reverse_sequence(self_attn, lengths), lengths,
+                  w["bi-lstm/bidirectional_rnn/bw/lstm_cell/kernel"], w["bi-lstm/bidirectional_rnn/bw/lstm_cell/bias"])
+        return np.concatenate([fw, reverse_sequence(bw, lengths)], axis=-1)
+
+    def logits(self, x, e1, e2, p1, p2):
+        w = self.w
+        p1 = w["position-embeddings/W_pos"][p1]
+        p2 = w["position-embeddings/W_pos"][p2]
+        attn, _, _, _ = attention(self.encode(x), e1, e2, p1, p2, w)
+        return dense(attn, w["output/dense/kernel"], w["output/dense/bias"])
+
+    def pair_logits(self, x, sentence_idx, e1, e2, p1, p2):
+        """
+        Logits of every entity pair with one encoder pass per sentence; only
+        the entity-aware attention and the output layer run per pair.
+        """
+        w = self.w
+        p1 = w["position-embeddings/W_pos"][p1]
+        p2 = w["position-embeddings/W_pos"][p2]
+        attn, _, _, _ = attention(self.encode(x), e1, e2, p1, p2, w, sentence_idx=sentence_idx)
+        return dense(attn, w["output/dense/kernel"], w["output/dense/bias"])
+
+    def predict_pairs(self, sentences, batch_size=256):
+        """
+        Predicts label ids for (tokens, [(e1, e2), ...]) marker-free
+        sentences; returns one list of label ids per sentence.
+        """
+        results = []
+        for start in range(0, len(sentences), batch_size):
+            batch = sentences[start:start + batch_size]
+            predictions = np.argmax(self.pair_logits(*self.transform_pairs(batch)), axis=1).tolist()
+            for _, pairs in batch:
+                results.append(predictions[:len(pairs)])
+                predictions = predictions[len(pairs):]
+        return results
+
+    def predict_preprocessed(self, examples, batch_size=256):
+        """
+        Predicts label ids for (tokens, e1, e2) examples.
+        """
+        predictions = []
+        for start in range(0, len(examples), batch_size):
+            x, e1, e2, p1, p2 = self.transform(examples[start:start + batch_size])
+            predictions += np.argmax(self.logits(x, e1, e2, p1, p2), axis=1).tolist()
+        return predictions
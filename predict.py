@@ -0,0 +1,172 @@
+import os
+import numpy as np
+
+import data_helpers
+import utils
+from configure import parse_args
+from prediction_cache import PredictionCache, make_key
+
+
+def latest_checkpoint(checkpoint_dir):
+    # Same as tf.train.latest_checkpoint, but without importing TensorFlow
+    with open(os.path.join(checkpoint_dir, "checkpoint"), "r") as f:
+        for line in f:
+            if line.startswith("model_checkpoint_path:"):
+                path = line.split(":", 1)[1].strip().strip('"')
+                if not os.path.isabs(path):
+                    path = os.path.join(checkpoint_dir, path)
+                return path
+    raise ValueError("No checkpoint found in {}".format(checkpoint_dir))
+
+
+class Predictor:
+    """
+    Predicts relations for raw sentences with <e1>/<e2> markers.
+
+    Queries go through an optional PredictionCache keyed by the normalized
+    tokens, entity indices and checkpoint id, so repeated inputs are answered
+    without touching TensorFlow. The graph is only restored on the first miss.
+    """
+    def __init__(self, checkpoint_dir, config, cache=None):
+        self.checkpoint_dir = checkpoint_dir
+        self.config = config
+        self.cache = cache
+        self.checkpoint_file = latest_checkpoint(checkpoint_dir)
+        run_name = os.path.basename(os.path.dirname(os.path.abspath(checkpoint_dir)))
+        self.checkpoint_id = "{}/{}".format(run_name, os.path.basename(self.checkpoint_file))
+        self._sess = None
+
+    def predict(self, sentences):
+        results = [None] * len(sentences)
+        pending = {}  # key => (tokens, e1, e2, [positions])
+        for i, sentence in enumerate(sentences):
+            tokens, e1, e2 = data_helpers.preprocess_sentence(sentence, not self.config.marker_free,
+                                                                self.config.entity_window)
+            key = make_key(tokens, e1, e2, self.checkpoint_id)
+            if key in pending:
+                pending[key][3].append(i)
+                continue
+            if self.cache is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            pending[key] = (tokens, e1, e2, [i])
+
+        if pending:
+            keys = list(pending.keys())
+            predictions = self.predict_preprocessed([pending[key][:3] for key in keys])
+            for key, prediction in zip(keys, predictions):
+                relation = utils.label2class[int(prediction)]
+                for i in pending[key][3]:
+                    results[i] = relation
+                if self.cache is not None:
+                    self.cache.put(key, relation)
+        return results
+
+    def _load(self):
+        import tensorflow as tf
+
+        vocab_path = os.path.join(self.checkpoint_dir, "..", "vocab")
+        self.vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(vocab_path)
+        position_path = os.path.join(self.checkpoint_dir, "..", "pos_vocab")
+        self.pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(position_path)
+
+        graph = tf.Graph()
+        with graph.as_default():
+            session_conf = tf.ConfigProto(
+                allow_soft_placement=self.config.allow_soft_placement,
+                log_device_placement=self.config.log_device_placement)
+            session_conf.gpu_options.allow_growth = self.config.gpu_allow_growth
+            self._sess = tf.Session(config=session_conf)
+            saver = tf.train.import_meta_graph("{}.meta".format(self.checkpoint_file))
+            saver.restore(self._sess, self.checkpoint_file)
+
+            self.input_x = graph.get_operation_by_name("input_x").outputs[0]
+            self.input_text = graph.get_operation_by_name("input_text").outputs[0]
+            self.input_e1 = graph.get_operation_by_name("input_e1").outputs[0]
+            self.input_e2 = graph.get_operation_by_name("input_e2").outputs[0]
+            self.input_p1 = graph.get_operation_by_name("input_p1").outputs[0]
+            self.input_p2 = graph.get_operation_by_name("input_p2").outputs[0]
+            self.emb_dropout_keep_prob = graph.get_operation_by_name("emb_dropout_keep_prob").outputs[0]
+            self.rnn_dropout_keep_prob = graph.get_operation_by_name("rnn_dropout_keep_prob").outputs[0]
+            self.dropout_keep_prob = graph.get_operation_by_name("dropout_keep_prob").outputs[0]
+            self.predictions = graph.get_operation_by_name("output/predictions").outputs[0]
+            self.logits = graph.get_operation_by_name("output/dense/BiasAdd").outputs[0]
+
+    def run(self, fetches, x, text, e1, e2, p1, p2):
+        """
+        Runs `fetches` (e.g. self.predictions, self.logits) on already
+        vocab-encoded inputs, with dropout disabled.
+        """
+        if self._sess is None:
+            self._load()
+        feed_dict = {
+            self.input_x: x,
+            self.input_text: text,
+            self.input_e1: e1,
+            self.input_e2: e2,
+            self.input_p1: p1,
+            self.input_p2: p2,
+            self.emb_dropout_keep_prob: 1.0,
+            self.rnn_dropout_keep_prob: 1.0,
+            self.dropout_keep_prob: 1.0
+        }
+        return self._sess.run(fetches, feed_dict)
+
+    def transform(self, examples):
+        """
+        (tokens, e1, e2) examples => inputs of `run` (x, text, e1, e2, p1, p2).
+        """
+        if self._sess is None:
+            self._load()
+
+        text = [" ".join(tokens) for tokens, _, _ in examples]
+        e1 = [e1 for _, e1, _ in examples]
+        e2 = [e2 for _, _, e2 in examples]
+        positions = [data_helpers.relative_position(len(tokens), e1, e2, self.config.max_sentence_length)
+                     for tokens, e1, e2 in examples]
+        x = np.array(list(self.vocab_processor.transform(text)))
+        p1 = np.array(list(self.pos_vocab_processor.transform([p[0] for p in positions])))
+        p2 = np.array(list(self.pos_vocab_processor.transform([p[1] for p in positions])))
+        return x, text, e1, e2, p1, p2
+
+    def predict_preprocessed(self, examples):
+        """
+        Predicts label ids for (tokens, e1, e2) examples, bypassing the cache.
+        """
+        x, text, e1, e2, p1, p2 = self.transform(examples)
+
+        predictions = []
+        for start in range(0, len(examples), self.config.batch_size):
+            end = start + self.config.batch_size
+            predictions += self.run(self.predictions, x[start:end], text[start:end], e1[start:end], e2[start:end],
+                                    p1[start:end], p2[start:end]).tolist()
+        return predictions
+
+
+def predict(config):
+    cache = None
+    if config.cache_size > 0 or config.cache_dir is not None:
+        cache = PredictionCache(config.cache_size, disk_dir=config.cache_dir)
+    predictor = Predictor(config.checkpoint_dir, config, cache=cache)
+
+    # One sentence per line, optionally in the SemEval `id<TAB>"sentence"` format
+    sentences = []
+    for line in open(config.predict_path):
+        line = line.strip()
+        if not line:
+            continue
+        sentence = line.split("\t")[-1]
+        if sentence.startswith('"') and sentence.endswith('"'):
+            sentence = sentence[1:-1]
+        sentences.append(sentence)
+
+    for i, relation in enumerate(predictor.predict(sentences)):
+        print("{}\t{}".format(i, relation))
+    if cache is not None:
+        print("\nCache: {}".format(cache.stats()))
+
+
+if __name__ == "__main__":
+    predict(parse_args())
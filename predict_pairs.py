@@ -0,0 +1,62 @@
+import os
+import json
+import time
+
+import data_helpers
+import utils
+from configure import parse_args
+from numpy_model import NumpyEntityAttention
+
+
+def load_pairs(path):
+    """
+    One JSON object per line:
+        {"sentence": "...", "entities": [[start, end], ...], "pairs": [[0, 1], ...]}
+    `sentence` has no <e1>/<e2> markers; entity spans are [start, end) token
+    offsets in data_helpers.tokenize(sentence). Without "pairs", every pair
+    (i, j) with i < j is classified.
+    """
+    sentences = []
+    for line in open(path):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        tokens = data_helpers.tokenize(item["sentence"])
+        # Like the training data, an entity is represented by its last word
+        ends = [end - 1 for _, end in item["entities"]]
+        pairs = item.get("pairs") or [(i, j) for i in range(len(ends)) for j in range(i + 1, len(ends))]
+        sentences.append((tokens, [(ends[i], ends[j]) for i, j in pairs]))
+    return sentences
+
+
+def predict_pairs(config):
+    export_dir = config.export_dir or os.path.join(config.checkpoint_dir, "..", "numpy_model")
+    model = NumpyEntityAttention(export_dir)
+    if not model.marker_free:
+        print("Warning: the model was trained with entity markers (train with --marker_free for this mode)\n")
+
+    sentences = load_pairs(config.pairs_path)
+    num_pairs = sum(len(pairs) for _, pairs in sentences)
+
+    # Shared encoder: one encoder pass per sentence, attention + output per pair
+    start = time.perf_counter()
+    results = model.predict_pairs(sentences, batch_size=config.batch_size)
+    shared_time = time.perf_counter() - start
+
+    # Baseline: one full forward pass per pair
+    examples = [(tokens, e1, e2) for tokens, pairs in sentences for e1, e2 in pairs]
+    start = time.perf_counter()
+    model.predict_preprocessed(examples, batch_size=config.batch_size)
+    per_pair_time = time.perf_counter() - start
+
+    for idx, ((tokens, pairs), predictions) in enumerate(zip(sentences, results)):
+        for (e1, e2), prediction in zip(pairs, predictions):
+            print("{}\t{}\t{}\t{}".format(idx, tokens[e1], tokens[e2], utils.label2class[prediction]))
+
+    print("\n{} sentences, {} pairs".format(len(sentences), num_pairs))
+    print("shared encoder: {:.1f} pairs/sec".format(num_pairs / shared_time))
+    print("pair-by-pair:   {:.1f} pairs/sec".format(num_pairs / per_pair_time))
+
+
+if __name__ == "__main__":
+    predict_pairs(parse_args())
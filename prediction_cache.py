@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+
+def make_key(tokens, e1, e2, checkpoint_id):
+    """
+    Cache key of one query: normalized token sequence (output of
+    data_helpers.preprocess_sentence), entity indices and model checkpoint.
+    """
+    payload = json.dumps([checkpoint_id, int(e1), int(e2), list(tokens)], separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions with an optional on-disk tier.
+
+    The in-memory tier keeps the `capacity` most recently used entries. When
+    `disk_dir` is given every entry is also written there (one small JSON file
+    per key), so it survives restarts and can be shared between workers; a
+    disk hit is promoted back into memory.
+    """
+    def __init__(self, capacity, disk_dir=None):
+        self.capacity = capacity
+        self.disk_dir = disk_dir
+        if self.disk_dir is not None and not os.path.exists(self.disk_dir):
+            os.makedirs(self.disk_dir)
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        value = self._read_disk(key)
+        if value is not None:
+            self.disk_hits += 1
+            self._insert(key, value)
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._insert(key, value)
+        self._write_disk(key, value)
+
+    def stats(self):
+        return {"size": len(self._entries), "capacity": self.capacity,
+                "hits": self.hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    def _insert(self, key, value):
+        if self.capacity <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def _write_disk(self, key, value):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,64 @@
+import os
+import html
+
+from attention_store import AttentionStore
+from configure import parse_args
+
+
+def _highlight(tokens, weights, color):
+    weights = weights[:len(tokens)]
+    peak = max(weights.max(), 1e-12) if len(weights) else 1.0
+    return " ".join('<font style="background: rgba({}, {:.4f})">{}</font>'.format(color, weight / peak,
+                                                                                   html.escape(token))
+                    for token, weight in zip(tokens, weights))
+
+
+def render_example(example):
+    tokens = example["tokens"]
+    status = "correct" if example["label"] == example["prediction"] else "misclassified"
+    lines = [
+        "<div class='example {}'>".format(status),
+        "<b>#{}</b> gold: {} / predicted: {}".format(example["id"], example["label"], example["prediction"]),
+        "<br>e1 = {} type {}, e2 = {} type {}".format(
+            html.escape(tokens[example["e1"]]) if example["e1"] < len(tokens) else "?",
+            " ".join("{:.2f}".format(a) for a in example["e1_alphas"]),
+            html.escape(tokens[example["e2"]]) if example["e2"] < len(tokens) else "?",
+            " ".join("{:.2f}".format(a) for a in example["e2_alphas"])),
+        "<br>attention: " + _highlight(tokens, example["alphas"], "255, 255, 0"),
+    ]
+    if example["self_alphas"] is not None:
+        # Self-attention from the entity words, averaged over heads
+        mean_alphas = example["self_alphas"].mean(axis=0)
+        for name in ("e1", "e2"):
+            if example[name] < mean_alphas.shape[0]:
+                lines.append("<br>self-attention from {}: ".format(name) +
+                             _highlight(tokens, mean_alphas[example[name]], "0, 160, 255"))
+    lines.append("</div><hr>")
+    return "\n".join(lines)
+
+
+def render_page(store, ids, page, page_size):
+    page_ids = ids[page * page_size:(page + 1) * page_size]
+    num_pages = max(1, (len(ids) + page_size - 1) // page_size)
+    header = "<p>{} examples selected, page {}/{}</p>\n".format(len(ids), page + 1, num_pages)
+    return header + "\n".join(render_example(store.example(idx)) for idx in page_ids)
+
+
+def render_attention(config):
+    """
+    Renders one page of the examples selected from the attention store
+    written by visualize.py, without rerunning inference.
+    """
+    attention_path = config.attention_path or os.path.join(config.checkpoint_dir, "..", "attention")
+    store = AttentionStore(attention_path)
+    if config.example_ids:
+        ids = [int(idx) for idx in config.example_ids.split(",")]
+    else:
+        ids = store.select(config.select, config.relation)
+    with open(config.html_path, "w") as html_file:
+        html_file.write(render_page(store, ids, config.page, config.page_size))
+    print("Wrote page {} of {} selected examples to {}".format(config.page, len(ids), config.html_path))
+
+
+if __name__ == "__main__":
+    render_attention(parse_args())
@@ -4,9 +4,12 @@ import numpy as np
 import tensorflow as tf
 
 import data_helpers
-from configure import FLAGS
+from configure import parse_args
 from logger import Logger
+from checkpoint import ResumeCheckpoint
+from predict import Predictor
 from model.entity_att_lstm import EntityAttentionLSTM
+from model.entity_att_cnn import EntityAttentionCNN
 import utils
 
 import warnings
@@ -14,11 +17,116 @@ import sklearn.exceptions
 warnings.filterwarnings("ignore", category=sklearn.exceptions.UndefinedMetricWarning)
 
 
-def train():
+def create_model(config, sequence_length, num_classes, vocab_size, pos_vocab_size):
+    if config.model == "cnn":
+        return EntityAttentionCNN(
+            sequence_length=sequence_length,
+            num_classes=num_classes,
+            vocab_size=vocab_size,
+            embedding_size=config.embedding_size,
+            pos_vocab_size=pos_vocab_size,
+            pos_embedding_size=config.pos_embedding_size,
+            hidden_size=config.hidden_size,
+            attention_size=config.attention_size,
+            num_conv_layers=config.num_conv_layers,
+            kernel_size=config.kernel_size,
+            use_elmo=(config.embeddings == 'elmo'),
+            l2_reg_lambda=config.l2_reg_lambda)
+    return EntityAttentionLSTM(
+        sequence_length=sequence_length,
+        num_classes=num_classes,
+        vocab_size=vocab_size,
+        embedding_size=config.embedding_size,
+        pos_vocab_size=pos_vocab_size,
+        pos_embedding_size=config.pos_embedding_size,
+        hidden_size=config.hidden_size,
+        num_heads=config.num_heads,
+        attention_size=config.attention_size,
+        use_elmo=(config.embeddings == 'elmo'),
+        l2_reg_lambda=config.l2_reg_lambda)
+
+
+def create_train_op(config, loss):
+    global_step = tf.Variable(0, name="global_step", trainable=False)
+    optimizer = tf.train.AdadeltaOptimizer(config.learning_rate, config.decay_rate, 1e-6)
+    gvs = optimizer.compute_gradients(loss)
+    capped_gvs = [(tf.clip_by_value(grad, -1.0, 1.0), var) for grad, var in gvs]
+    train_op = optimizer.apply_gradients(capped_gvs, global_step=global_step)
+    return global_step, train_op
+
+
+def softmax(logits, temperature=1.0):
+    logits = logits / temperature
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def eval_batch_size(config, num_examples):
+    """
+    `--eval_batch_size`, or with 0 the largest batch whose estimated forward
+    activations fit in `--eval_memory_mb`. The estimate counts the float32
+    tensors of one example at inference (embeddings, self-attention maps,
+    encoder states and entity attention) with 2x headroom for temporaries.
+    """
+    if config.eval_batch_size > 0:
+        return min(config.eval_batch_size, num_examples)
+    seq_len = config.max_sentence_length
+    embedding_size = 1024 if config.embeddings == "elmo" else config.embedding_size
+    input_size = embedding_size + 2 * config.pos_embedding_size
+    if config.model == "cnn":
+        encoder = config.num_conv_layers * 4 * config.hidden_size
+        self_attention = 0
+    else:
+        encoder = 10 * config.hidden_size  # 2 directions x (4 gates + output)
+        self_attention = 4 * input_size + 3 * config.num_heads * seq_len
+    floats = seq_len * (2 * input_size + self_attention + encoder + 4 * config.attention_size)
+    batch_size = int(config.eval_memory_mb * 2 ** 20 // (2 * 4 * floats))
+    return max(1, min(batch_size, num_examples))
+
+
+def evaluate(sess, model, config, data, batch_size):
+    """
+    Inference-only pass over `data` ((x, y, text, e1, e2, p1, p2) arrays):
+    fetches logits and predictions only, and computes the loss and accuracy
+    in NumPy, weighted by example so a short last batch counts correctly.
+    The keep probabilities are left at their 1.0 default, which skips the
+    dropout branches (no random masks) of the shared training graph.
+    Returns (loss, accuracy, predictions).
+    """
+    x, y, text, e1, e2, p1, p2 = data
+    logits = []
+    predictions = []
+    for start in range(0, len(x), batch_size):
+        end = start + batch_size
+        feed_dict = {
+            model.input_x: x[start:end],
+            model.input_text: text[start:end],
+            model.input_e1: e1[start:end],
+            model.input_e2: e2[start:end],
+            model.input_p1: p1[start:end],
+            model.input_p2: p2[start:end]
+        }
+        batch_logits, batch_predictions = sess.run([model.logits, model.predictions], feed_dict)
+        logits.append(batch_logits)
+        predictions.append(batch_predictions)
+    logits = np.concatenate(logits)
+    predictions = np.concatenate(predictions).astype('int')
+
+    # Same loss as model.loss: mean cross-entropy + l2 penalty (which does not depend on the batch)
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    log_probs = shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+    loss = -np.mean(np.sum(y * log_probs, axis=1))
+    if config.l2_reg_lambda > 0:
+        loss += config.l2_reg_lambda * sess.run(model.l2)
+    accuracy = np.mean(predictions == np.argmax(y, axis=1))
+    return loss, accuracy, predictions
+
+
+def train(config):
     with tf.device('/cpu:0'):
-        train_text, train_y, train_e1, train_e2, train_pos1, train_pos2 = data_helpers.load_data_and_labels(FLAGS.train_path)
+        train_text, train_y, train_e1, train_e2, train_pos1, train_pos2 = data_helpers.load_data_and_labels(config.train_path, config.max_sentence_length, entity_markers=not config.marker_free, entity_window=config.entity_window)
     with tf.device('/cpu:0'):
-        test_text, test_y, test_e1, test_e2, test_pos1, test_pos2 = data_helpers.load_data_and_labels(FLAGS.test_path)
+        test_text, test_y, test_e1, test_e2, test_pos1, test_pos2 = data_helpers.load_data_and_labels(config.test_path, config.max_sentence_length, entity_markers=not config.marker_free, entity_window=config.entity_window)
 
     # Build vocabulary
     # Example: x_text[3] = "A misty <e1>ridge</e1> uprises from the <e2>surge</e2>."
@@ -26,8 +134,14 @@ def train():
     # =>
     # [27 39 40 41 42  1 43  0  0 ... 0]
     # dimension = MAX_SENTENCE_LENGTH
-    vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor(FLAGS.max_sentence_length)
-    vocab_processor.fit(train_text + test_text)
+    # A resumed run keeps its vocabulary, a distilled student shares the teacher's one
+    vocab_dir = config.resume or (config.teacher_dir and os.path.join(config.teacher_dir, ".."))
+    if vocab_dir:
+        vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(
+            os.path.join(vocab_dir, "vocab"))
+    else:
+        vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor(config.max_sentence_length)
+        vocab_processor.fit(train_text + test_text)
     train_x = np.array(list(vocab_processor.transform(train_text)))
     test_x = np.array(list(vocab_processor.transform(test_text)))
     train_text = np.array(train_text)
@@ -43,8 +157,12 @@ def train():
     # =>
     # [11 12 13 14 15  16  21  17  17  17 ...  17]
     # dimension = MAX_SENTENCE_LENGTH
-    pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor(FLAGS.max_sentence_length)
-    pos_vocab_processor.fit(train_pos1 + train_pos2 + test_pos1 + test_pos2)
+    if vocab_dir:
+        pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(
+            os.path.join(vocab_dir, "pos_vocab"))
+    else:
+        pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor(config.max_sentence_length)
+        pos_vocab_processor.fit(train_pos1 + train_pos2 + test_pos1 + test_pos2)
     train_p1 = np.array(list(pos_vocab_processor.transform(train_pos1)))
     train_p2 = np.array(list(pos_vocab_processor.transform(train_pos2)))
     test_p1 = np.array(list(pos_vocab_processor.transform(test_pos1)))
@@ -54,40 +172,68 @@ def train():
     print("test_p1 = {0}".format(test_p1.shape))
     print("")
 
+    # Output directory for models and summaries
+    if config.resume:
+        out_dir = os.path.abspath(config.resume)
+    else:
+        timestamp = str(int(time.time()))
+        out_dir = os.path.abspath(os.path.join(os.path.curdir, "runs", timestamp))
+    print("\nWriting to {}\n".format(out_dir))
+
+    # A resumed run restores its own (fine-tuned) word embeddings
+    pretrain_W = None
+    if not config.resume:
+        pretrain_W = utils.load_pretrained_embeddings(config.embeddings, config.embedding_size, vocab_processor)
+
+    fit(config,
+        (train_x, train_y, train_text, train_e1, train_e2, train_p1, train_p2),
+        (test_x, test_y, test_text, test_e1, test_e2, test_p1, test_p2),
+        vocab_processor, pos_vocab_processor, out_dir, pretrain_W=pretrain_W)
+
+
+def fit(config, train_data, test_data, vocab_processor, pos_vocab_processor, out_dir,
+        target_path=None, session_conf=None, pretrain_W=None):
+    """
+    Trains a model on already vocab-encoded data and evaluates it on
+    `test_data` (scored against `target_path`, default: the official test
+    key). Returns the F1 of the final model; the best F1 over all evaluations
+    (used to pick checkpoints) is in the logs. `train_data` and `test_data`
+    are (x, y, text, e1, e2, p1, p2) tuples. `pretrain_W` initializes W_text
+    of a new run (see utils.load_pretrained_embeddings).
+    """
+    train_x, train_y, train_text, train_e1, train_e2, train_p1, train_p2 = train_data
+
     with tf.Graph().as_default():
-        session_conf = tf.ConfigProto(
-            allow_soft_placement=FLAGS.allow_soft_placement,
-            log_device_placement=FLAGS.log_device_placement)
-        session_conf.gpu_options.allow_growth = FLAGS.gpu_allow_growth
+        if session_conf is None:
+            session_conf = tf.ConfigProto(
+                allow_soft_placement=config.allow_soft_placement,
+                log_device_placement=config.log_device_placement)
+            session_conf.gpu_options.allow_growth = config.gpu_allow_growth
         sess = tf.Session(config=session_conf)
         with sess.as_default():
-            model = EntityAttentionLSTM(
-                sequence_length=train_x.shape[1],
-                num_classes=train_y.shape[1],
-                vocab_size=len(vocab_processor.vocabulary_),
-                embedding_size=FLAGS.embedding_size,
-                pos_vocab_size=len(pos_vocab_processor.vocabulary_),
-                pos_embedding_size=FLAGS.pos_embedding_size,
-                hidden_size=FLAGS.hidden_size,
-                num_heads=FLAGS.num_heads,
-                attention_size=FLAGS.attention_size,
-                use_elmo=(FLAGS.embeddings == 'elmo'),
-                l2_reg_lambda=FLAGS.l2_reg_lambda)
+            model = create_model(config,
+                                 sequence_length=train_x.shape[1],
+                                 num_classes=train_y.shape[1],
+                                 vocab_size=len(vocab_processor.vocabulary_),
+                                 pos_vocab_size=len(pos_vocab_processor.vocabulary_))
 
-            # Define Training procedure
-            global_step = tf.Variable(0, name="global_step", trainable=False)
-            optimizer = tf.train.AdadeltaOptimizer(FLAGS.learning_rate, FLAGS.decay_rate, 1e-6)
-            gvs = optimizer.compute_gradients(model.loss)
-            capped_gvs = [(tf.clip_by_value(grad, -1.0, 1.0), var) for grad, var in gvs]
-            train_op = optimizer.apply_gradients(capped_gvs, global_step=global_step)
+            # Knowledge distillation from a trained teacher checkpoint (e.g. EntityAttentionLSTM)
+            train_loss = model.loss
+            teacher = None
+            if config.teacher_dir:
+                teacher = Predictor(config.teacher_dir, config)
+                teacher_probs = tf.placeholder(tf.float32, shape=[None, train_y.shape[1]], name='teacher_probs')
+                with tf.variable_scope("distillation"):
+                    T = config.distill_temperature
+                    distill_loss = tf.reduce_mean(tf.nn.softmax_cross_entropy_with_logits_v2(
+                        logits=model.logits / T, labels=teacher_probs)) * T * T
+                    train_loss = (1 - config.distill_alpha) * model.loss + config.distill_alpha * distill_loss
 
-            # Output directory for models and summaries
-            timestamp = str(int(time.time()))
-            out_dir = os.path.abspath(os.path.join(os.path.curdir, "runs", timestamp))
-            print("\nWriting to {}\n".format(out_dir))
+            # Define Training procedure
+            global_step, train_op = create_train_op(config, train_loss)
 
             # Logger
-            logger = Logger(out_dir)
+            logger = Logger(out_dir, config, resume=bool(config.resume), target_path=target_path)
 
             # Summaries for loss and accuracy
             loss_summary = tf.summary.scalar("loss", model.loss)
@@ -103,103 +249,142 @@ def train():
             checkpoint_prefix = os.path.join(checkpoint_dir, "model")
             if not os.path.exists(checkpoint_dir):
                 os.makedirs(checkpoint_dir)
-            saver = tf.train.Saver(tf.global_variables(), max_to_keep=FLAGS.num_checkpoints)
+            saver = tf.train.Saver(tf.global_variables(), max_to_keep=config.num_checkpoints)
+            # Periodic checkpoint with optimizer, step, data-order and best-F1 state
+            resume_checkpoint = ResumeCheckpoint(checkpoint_dir, tf.global_variables(),
+                                                 async_write=config.async_checkpoint)
 
             # Write vocabulary
-            vocab_processor.save(os.path.join(out_dir, "vocab"))
-            pos_vocab_processor.save(os.path.join(out_dir, "pos_vocab"))
+            if not config.resume:
+                vocab_processor.save(os.path.join(out_dir, "vocab"))
+                pos_vocab_processor.save(os.path.join(out_dir, "pos_vocab"))
+                utils.save_hparams(out_dir, config)
 
             # Initialize all variables
             sess.run(tf.global_variables_initializer())
 
-            if FLAGS.embeddings == "word2vec":
-                pretrain_W = utils.load_word2vec('resource/GoogleNews-vectors-negative300.bin', FLAGS.embedding_size, vocab_processor)
-                sess.run(model.W_text.assign(pretrain_W))
-                print("Success to load pre-trained word2vec model!\n")
-            elif FLAGS.embeddings == "glove100":
-                pretrain_W = utils.load_glove('resource/glove.6B.100d.txt', FLAGS.embedding_size, vocab_processor)
+            state = None
+            if config.resume:
+                state = resume_checkpoint.restore(sess)
+                if state is None:
+                    raise ValueError("No resume checkpoint found in {}".format(checkpoint_dir))
+                if state["batch_size"] != config.batch_size:
+                    raise ValueError("Cannot resume a run trained with batch_size={} using batch_size={}"
+                                     .format(state["batch_size"], config.batch_size))
+                print("Resuming from step {} (epoch {}, batch {})\n".format(state["step"], state["epoch"],
+                                                                           state["batch"]))
+            elif pretrain_W is not None:
                 sess.run(model.W_text.assign(pretrain_W))
-                print("Success to load pre-trained glove100 model!\n")
-            elif FLAGS.embeddings == "glove300":
-                pretrain_W = utils.load_glove('resource/glove.840B.300d.txt', FLAGS.embedding_size, vocab_processor)
-                sess.run(model.W_text.assign(pretrain_W))
-                print("Success to load pre-trained glove300 model!\n")
+                print("Success to load pre-trained {} model!\n".format(config.embeddings))
 
             # Generate batches
+            if state is not None:
+                seed, start_epoch, start_batch = state["seed"], state["epoch"], state["batch"]
+            else:
+                seed = config.seed if config.seed is not None else np.random.randint(2 ** 31 - 1)
+                start_epoch, start_batch = 0, 0
+            num_batches_per_epoch = int((len(train_x) - 1) / config.batch_size) + 1
+            test_batch_size = eval_batch_size(config, len(test_data[0]))
+            print("Evaluation batch size = {}\n".format(test_batch_size))
             train_batches = data_helpers.batch_iter(list(zip(train_x, train_y, train_text,
                                                              train_e1, train_e2, train_p1, train_p2)),
-                                                    FLAGS.batch_size, FLAGS.num_epochs)
+                                                    config.batch_size, config.num_epochs, seed=seed,
+                                                    start_epoch=start_epoch, start_batch=start_batch)
             # Training loop. For each batch...
+            step = tf.train.global_step(sess, global_step)
             best_f1 = 0.0  # For save checkpoint(model)
-            for train_batch in train_batches:
-                train_bx, train_by, train_btxt, train_be1, train_be2, train_bp1, train_bp2 = zip(*train_batch)
-                feed_dict = {
-                    model.input_x: train_bx,
-                    model.input_y: train_by,
-                    model.input_text: train_btxt,
-                    model.input_e1: train_be1,
-                    model.input_e2: train_be2,
-                    model.input_p1: train_bp1,
-                    model.input_p2: train_bp2,
-                    model.emb_dropout_keep_prob: FLAGS.emb_dropout_keep_prob,
-                    model.rnn_dropout_keep_prob: FLAGS.rnn_dropout_keep_prob,
-                    model.dropout_keep_prob: FLAGS.dropout_keep_prob
-                }
-                _, step, summaries, loss, accuracy = sess.run(
-                    [train_op, global_step, train_summary_op, model.loss, model.accuracy], feed_dict)
-                train_summary_writer.add_summary(summaries, step)
-
-                # Training log display
-                if step % FLAGS.display_every == 0:
-                    logger.logging_train(step, loss, accuracy)
-
-                # Evaluation
-                if step % FLAGS.evaluate_every == 0:
-                    print("\nEvaluation:")
-                    # Generate batches
-                    test_batches = data_helpers.batch_iter(list(zip(test_x, test_y, test_text,
-                                                                    test_e1, test_e2, test_p1, test_p2)),
-                                                           FLAGS.batch_size, 1, shuffle=False)
-                    # Training loop. For each batch...
-                    losses = 0.0
-                    accuracy = 0.0
-                    predictions = []
-                    iter_cnt = 0
-                    for test_batch in test_batches:
-                        test_bx, test_by, test_btxt, test_be1, test_be2, test_bp1, test_bp2 = zip(*test_batch)
-                        feed_dict = {
-                            model.input_x: test_bx,
-                            model.input_y: test_by,
-                            model.input_text: test_btxt,
-                            model.input_e1: test_be1,
-                            model.input_e2: test_be2,
-                            model.input_p1: test_bp1,
-                            model.input_p2: test_bp2,
-                            model.emb_dropout_keep_prob: 1.0,
-                            model.rnn_dropout_keep_prob: 1.0,
-                            model.dropout_keep_prob: 1.0
-                        }
-                        loss, acc, pred = sess.run(
-                            [model.loss, model.accuracy, model.predictions], feed_dict)
-                        losses += loss
-                        accuracy += acc
-                        predictions += pred.tolist()
-                        iter_cnt += 1
-                    losses /= iter_cnt
-                    accuracy /= iter_cnt
-                    predictions = np.array(predictions, dtype='int')
-
-                    logger.logging_eval(step, loss, accuracy, predictions)
-
-                    # Model checkpoint
-                    if best_f1 < logger.best_f1:
-                        best_f1 = logger.best_f1
-                        path = saver.save(sess, checkpoint_prefix+"-{:.3g}".format(best_f1), global_step=step)
-                        print("Saved model checkpoint to {}\n".format(path))
+            if state is not None:
+                best_f1 = logger.best_f1 = state["best_f1"]
+
+            def save_resume_checkpoint(step):
+                # global_step counts consumed batches, which fixes the position in the data order
+                resume_checkpoint.save(sess, {"step": int(step),
+                                              "epoch": int(step // num_batches_per_epoch),
+                                              "batch": int(step % num_batches_per_epoch),
+                                              "seed": int(seed),
+                                              "batch_size": config.batch_size,
+                                              "best_f1": best_f1})
+
+            def run_evaluation(step):
+                nonlocal best_f1, last_eval_step
+                print("\nEvaluation:")
+                eval_loss, accuracy, predictions = evaluate(sess, model, config, test_data, test_batch_size)
+                f1 = logger.logging_eval(step, eval_loss, accuracy, predictions)
+                last_eval_step = step
+
+                # Model checkpoint
+                if best_f1 < logger.best_f1:
+                    best_f1 = logger.best_f1
+                    path = saver.save(sess, checkpoint_prefix+"-{:.3g}".format(best_f1), global_step=step)
+                    print("Saved model checkpoint to {}\n".format(path))
+                return f1
+
+            f1 = None
+            last_eval_step = None
+            # Close (drain) the logger and the summary writer on every exit path, so the
+            # last evaluations before a crash or interruption are on disk for --resume
+            try:
+                for train_batch in train_batches:
+                    train_bx, train_by, train_btxt, train_be1, train_be2, train_bp1, train_bp2 = zip(*train_batch)
+                    feed_dict = {
+                        model.input_x: train_bx,
+                        model.input_y: train_by,
+                        model.input_text: train_btxt,
+                        model.input_e1: train_be1,
+                        model.input_e2: train_be2,
+                        model.input_p1: train_bp1,
+                        model.input_p2: train_bp2,
+                        model.emb_dropout_keep_prob: config.emb_dropout_keep_prob,
+                        model.rnn_dropout_keep_prob: config.rnn_dropout_keep_prob,
+                        model.dropout_keep_prob: config.dropout_keep_prob
+                    }
+                    if teacher is not None:
+                        teacher_logits = teacher.run(teacher.logits, train_bx, train_btxt, train_be1, train_be2,
+                                                     train_bp1, train_bp2)
+                        feed_dict[teacher_probs] = softmax(teacher_logits, config.distill_temperature)
+                    # Only fetch the summaries / metrics on the steps that log them. Each run of
+                    # train_op increments global_step by one, so the step is tracked locally
+                    # instead of fetching global_step (whose read may precede the increment)
+                    step += 1
+                    display = step % config.display_every == 0
+                    write_summary = config.summary_every > 0 and step % config.summary_every == 0
+                    fetches = {"train_op": train_op}
+                    if display:
+                        fetches["loss"] = model.loss
+                        fetches["accuracy"] = model.accuracy
+                    if write_summary:
+                        fetches["summaries"] = train_summary_op
+                    results = sess.run(fetches, feed_dict)
+
+                    if write_summary:
+                        logger.add_summary(train_summary_writer, results["summaries"], step)
+
+                    # Training log display
+                    if display:
+                        logger.logging_train(step, results["loss"], results["accuracy"])
+
+                    # Evaluation
+                    if step % config.evaluate_every == 0:
+                        f1 = run_evaluation(step)
+
+                    # Resume checkpoint
+                    if config.checkpoint_every > 0 and step % config.checkpoint_every == 0:
+                        save_resume_checkpoint(step)
+
+                # The final model is always scored
+                if last_eval_step != step:
+                    f1 = run_evaluation(step)
+
+                save_resume_checkpoint(step)
+                resume_checkpoint.wait()
+            finally:
+                logger.close()
+                train_summary_writer.close()
+            return f1
 
 
 def main(_):
-    train()
+    train(parse_args())
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
-import tensorflow as tf
+import os
+import json
 import numpy as np
 
 class2label = {'Other': 0,
@@ -25,6 +26,8 @@ label2class = {0: 'Other',
 
 
 def initializer():
+    # Deferred so that preprocessing-only code never imports TensorFlow
+    import tensorflow as tf
     return tf.keras.initializers.glorot_normal()
 
 
@@ -68,3 +71,44 @@ def load_glove(word2vec_path, embedding_dim, vocab):
         if idx != 0:
             initW[idx] = embedding
     return initW
+
+
+def load_pretrained_embeddings(embeddings, embedding_dim, vocab):
+    """
+    Pre-trained matrix for `vocab` given the --embeddings option, or None if
+    the option does not name a pre-trained file (e.g. None or 'elmo').
+    """
+    if embeddings == "word2vec":
+        return load_word2vec('resource/GoogleNews-vectors-negative300.bin', embedding_dim, vocab)
+    elif embeddings == "glove100":
+        return load_glove('resource/glove.6B.100d.txt', embedding_dim, vocab)
+    elif embeddings == "glove300":
+        return load_glove('resource/glove.840B.300d.txt', embedding_dim, vocab)
+    return None
+
+
+# Flags that define the architecture and input encoding of a trained run
+MODEL_HPARAMS = ["model", "embeddings", "embedding_size", "pos_embedding_size", "hidden_size", "num_heads",
+                 "attention_size", "num_conv_layers", "kernel_size", "max_sentence_length", "marker_free",
+                 "entity_window"]
+
+
+def save_hparams(run_dir, config):
+    """
+    Writes the model hyper-parameters of `config` to <run_dir>/hparams.json,
+    next to the vocabularies, so tools working on the run need not repeat them.
+    """
+    with open(os.path.join(run_dir, "hparams.json"), "w") as f:
+        json.dump({name: getattr(config, name) for name in MODEL_HPARAMS}, f, indent=2)
+
+
+def load_hparams(run_dir):
+    """
+    Hyper-parameters saved by save_hparams, or None for runs trained before
+    they were saved.
+    """
+    path = os.path.join(run_dir, "hparams.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
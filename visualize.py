@@ -2,28 +2,26 @@ import os
 import numpy as np
 import tensorflow as tf
 import data_helpers
-import logger
-from configure import FLAGS
-import warnings
-import sklearn.exceptions
+from attention_store import AttentionStoreWriter
+from configure import parse_args
 
-warnings.filterwarnings("ignore", category=sklearn.exceptions.UndefinedMetricWarning)
 
-from tensor2tensor.visualization import attention
-
-
-def visualize():
+def visualize(config):
+    """
+    Runs the test set once and streams the attention weights to a chunked
+    store (see render_attention.py to browse it as HTML).
+    """
     with tf.device('/cpu:0'):
-        test_text, test_y, test_e1, test_e2, test_pos1, test_pos2 = data_helpers.load_data_and_labels(FLAGS.test_path)
+        test_text, test_y, test_e1, test_e2, test_pos1, test_pos2 = data_helpers.load_data_and_labels(config.test_path, config.max_sentence_length, entity_markers=not config.marker_free, entity_window=config.entity_window)
 
-    checkpoint_file = tf.train.latest_checkpoint(FLAGS.checkpoint_dir)
+    checkpoint_file = tf.train.latest_checkpoint(config.checkpoint_dir)
     print(checkpoint_file)
 
-    vocab_path = os.path.join(FLAGS.checkpoint_dir, "..", "vocab")
+    vocab_path = os.path.join(config.checkpoint_dir, "..", "vocab")
     vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(vocab_path)
 
     # Map data into position
-    position_path = os.path.join(FLAGS.checkpoint_dir, "..", "pos_vocab")
+    position_path = os.path.join(config.checkpoint_dir, "..", "pos_vocab")
     pos_vocab_processor = tf.contrib.learn.preprocessing.VocabularyProcessor.restore(position_path)
 
     test_x = np.array(list(vocab_processor.transform(test_text)))
@@ -41,9 +39,9 @@ def visualize():
     graph = tf.Graph()
     with graph.as_default():
         session_conf = tf.ConfigProto(
-            allow_soft_placement=FLAGS.allow_soft_placement,
-            log_device_placement=FLAGS.log_device_placement)
-        session_conf.gpu_options.allow_growth = FLAGS.gpu_allow_growth
+            allow_soft_placement=config.allow_soft_placement,
+            log_device_placement=config.log_device_placement)
+        session_conf.gpu_options.allow_growth = config.gpu_allow_growth
         sess = tf.Session(config=session_conf)
         with sess.as_default():
             # Load the saved meta graph and restore variables
@@ -60,51 +58,64 @@ def visualize():
             emb_dropout_keep_prob = graph.get_operation_by_name("emb_dropout_keep_prob").outputs[0]
             rnn_dropout_keep_prob = graph.get_operation_by_name("rnn_dropout_keep_prob").outputs[0]
             dropout_keep_prob = graph.get_operation_by_name("dropout_keep_prob").outputs[0]
-            self_alphas_op = graph.get_operation_by_name("self-attention/multihead_attention/Softmax").outputs[0]
+            predictions_op = graph.get_operation_by_name("output/predictions").outputs[0]
             alphas_op = graph.get_operation_by_name("attention/alphas").outputs[0]
             acc_op = graph.get_operation_by_name("accuracy/accuracy").outputs[0]
             e2_alphas_op = graph.get_operation_by_name("attention/e2_alphas").outputs[0]
             e1_alphas_op = graph.get_operation_by_name("attention/e1_alphas").outputs[0]
             latent_type_op = graph.get_operation_by_name("attention/latent_type").outputs[0]
+            fetches = [predictions_op, alphas_op, acc_op, e1_alphas_op, e2_alphas_op, latent_type_op]
+            # EntityAttentionCNN has no self-attention
+            has_self_attention = "self-attention/multihead_attention/Softmax" in [op.name for op in graph.get_operations()]
+            if has_self_attention:
+                fetches.append(graph.get_operation_by_name("self-attention/multihead_attention/Softmax").outputs[0])
 
             print("\nEvaluation:")
             # Generate batches
             test_batches = data_helpers.batch_iter(list(zip(test_x, test_y, test_text,
                                                             test_e1, test_e2, test_p1, test_p2)),
-                                                   FLAGS.batch_size, 1, shuffle=False)
+                                                   config.batch_size, 1, shuffle=False)
             # Training loop. For each batch...
             accuracy = 0.0
-            iter_cnt = 0
-            with open("visualization.html", "w") as html_file:
-                for test_batch in test_batches:
-                    test_bx, test_by, test_btxt, test_be1, test_be2, test_bp1, test_bp2 = zip(*test_batch)
-                    feed_dict = {
-                        input_x: test_bx,
-                        input_y: test_by,
-                        input_text: test_btxt,
-                        input_e1: test_be1,
-                        input_e2: test_be2,
-                        input_p1: test_bp1,
-                        input_p2: test_bp2,
-                        emb_dropout_keep_prob: 1.0,
-                        rnn_dropout_keep_prob: 1.0,
-                        dropout_keep_prob: 1.0
-                    }
-                    self_alphas, alphas, acc, e1_alphas, e2_alphas, latent_type = sess.run(
-                        [self_alphas_op, alphas_op, acc_op, e1_alphas_op, e2_alphas_op, latent_type_op], feed_dict)
-                    accuracy += acc
-                    iter_cnt += 1
-                    for text, alphas_values in zip(test_btxt, alphas):
-                        for word, alpha in zip(text.split(), alphas_values / alphas_values.max()):
-                            html_file.write(
-                                '<font style="background: rgba(255, 255, 0, %f)">%s</font>\n' % (alpha, word))
-                        html_file.write('<br>')
-            accuracy /= iter_cnt
+            num_examples = 0
+            attention_path = config.attention_path or os.path.join(config.checkpoint_dir, "..", "attention")
+            store = AttentionStoreWriter(attention_path)
+            for test_batch in test_batches:
+                test_bx, test_by, test_btxt, test_be1, test_be2, test_bp1, test_bp2 = zip(*test_batch)
+                feed_dict = {
+                    input_x: test_bx,
+                    input_y: test_by,
+                    input_text: test_btxt,
+                    input_e1: test_be1,
+                    input_e2: test_be2,
+                    input_p1: test_bp1,
+                    input_p2: test_bp2,
+                    emb_dropout_keep_prob: 1.0,
+                    rnn_dropout_keep_prob: 1.0,
+                    dropout_keep_prob: 1.0
+                }
+                results = sess.run(fetches, feed_dict)
+                predictions, alphas, acc, e1_alphas, e2_alphas, latent_type = results[:6]
+                self_alphas = None
+                if has_self_attention:
+                    # (heads*batch, seq_len, seq_len), head-major => (batch, heads, seq_len, seq_len)
+                    # The head count is the checkpoint's, whatever --num_heads says
+                    num_heads = results[6].shape[0] // len(test_bx)
+                    self_alphas = results[6].reshape((num_heads, len(test_bx)) + results[6].shape[1:])
+                    self_alphas = self_alphas.transpose(1, 0, 2, 3)
+                store.add_batch(test_btxt, np.argmax(test_by, axis=1), predictions, test_be1, test_be2,
+                                alphas, e1_alphas, e2_alphas, latent_type, self_alphas)
+                accuracy += acc * len(test_bx)
+                num_examples += len(test_bx)
+            accuracy /= num_examples
             print(accuracy)
 
+            store.close()
+            print("Saved attention weights to {}".format(attention_path))
+
 
 def main(_):
-    visualize()
+    visualize(parse_args())
 
 
 if __name__ == "__main__":